@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Throughput of the bundled aqi package, per algorithm and pollutant."""
+
+import support                                  # noqa: F401  sets up sys.path
+
+import aqi
+from aqi import algos
+
+ALGOS = [aqi.ALGO_EPA, aqi.ALGO_MEP, aqi.ALGO_EPA_NOWCAST, aqi.ALGO_EPA_PURPLEAIR]
+POLLUTANTS = [aqi.POLLUTANT_PM25, aqi.POLLUTANT_PM10, aqi.POLLUTANT_O3_8H, aqi.POLLUTANT_O3_1H,
+              aqi.POLLUTANT_CO_8H, aqi.POLLUTANT_SO2_1H, aqi.POLLUTANT_NO2_1H]
+SAMPLES = 200
+
+
+def concentrations(algo, elem, count=SAMPLES):
+    """Evenly spread concentrations covering the pollutant's breakpoint table.  Placeholder
+    (0, 0) segments, like the low end of EPA's 1-hour ozone, are left out."""
+    segments = [(float(bplo), float(bphi)) for (bplo, bphi) in algo.piecewise['bp'][elem] if bphi > bplo]
+    low = segments[0][0]
+    high = segments[-1][1]
+    return [str(round(low + (high - low) * i / count, 3)) for i in range(count)]
+
+
+class IAQI(object):
+
+    params = [ALGOS, POLLUTANTS]
+    param_names = ['algo', 'pollutant']
+
+    def setup(self, algo, elem):
+        self.aqi = algos.get_algo(algo)
+        if elem not in self.aqi.piecewise['bp']:
+            raise NotImplementedError("pollutant not covered by this algorithm")
+        self.ccs = concentrations(self.aqi, elem)
+        covered = [idx for idx, (bplo, bphi) in enumerate(self.aqi.piecewise['bp'][elem]) if bphi > bplo]
+        low, high = self.aqi.piecewise['aqi'][covered[0]][0], self.aqi.piecewise['aqi'][covered[-1]][1]
+        self.iaqis = [str(value) for value in range(low, high, 5)]
+
+    def time_to_iaqi(self, algo, elem):
+        for cc in self.ccs:
+            aqi.to_iaqi(elem, cc, algo=algo)
+
+    def time_to_iaqi_float(self, algo, elem):
+        for cc in self.ccs:
+            aqi.to_iaqi(elem, float(cc), algo=algo)
+
+    def time_to_iaqi_many(self, algo, elem):
+        aqi.to_iaqi_many(elem, self.ccs, algo=algo)
+
+    def time_to_cc(self, algo, elem):
+        for value in self.iaqis:
+            aqi.to_cc(elem, value, algo=algo)
+
+
+class AQI(object):
+
+    params = [ALGOS]
+    param_names = ['algo']
+
+    def setup(self, algo):
+        _aqi = algos.get_algo(algo)
+        readings = {elem: concentrations(_aqi, elem, 20) for elem in _aqi.piecewise['bp']}
+        self.ccs = [[(elem, ccs[i]) for elem, ccs in readings.items()] for i in range(20)]
+
+    def time_to_aqi(self, algo):
+        for ccs in self.ccs:
+            aqi.to_aqi(ccs, algo=algo)
+
+    def time_to_aqi_many(self, algo):
+        aqi.to_aqi_many(self.ccs, algo=algo)
+
+
+class Registry(object):
+
+    def time_get_algo(self):
+        algos.get_algo(aqi.ALGO_EPA)
+
+    def time_get_algo_unknown(self):
+        algos.get_algo('aqi.algos.unknown')
+
+    def time_list_algos(self):
+        algos.list_algos()
+
+    def time_discover_cold(self):
+        """Registry rebuild, the algorithm modules themselves stay imported."""
+        with algos._lock:
+            algos._registry.clear()
+            algos._unknown.clear()
+            algos._discovered = False
+        algos.list_algos()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""End-to-end poll cycles of the plugin against the fake PurpleAir server."""
+
+import asyncio
+import json
+
+import support
+from fake_purpleair import FakePurpleAir
+
+
+class PollCycle(object):
+    """One cloud poll of every sensor device through the polling thread path."""
+
+    params = [[10, 100, 500], [0.0, 0.05]]
+    param_names = ['sensors', 'latency']
+
+    def setup(self, sensors, latency):
+        self.server = FakePurpleAir(sensors, latency).start()
+        self.plugin = support.make_plugin(self.server)
+        self.devices = support.add_sensors(self.plugin, self.server, sensors)
+        self.keys = list(self.plugin.sensorDevices)
+
+    def teardown(self, sensors, latency):
+        support.remove_devices(self.plugin, self.devices)
+        self.plugin.shutdown()
+        self.server.stop()
+
+    def time_poll_cycle(self, sensors, latency):
+        self.plugin.pollDue(self.keys)
+
+    def time_async_poll_cycle(self, sensors, latency):
+        from async_poller import AsyncPollLoop
+
+        async def cycle():
+            await asyncio.gather(*AsyncPollLoop(self.plugin).dispatch(self.keys))
+
+        asyncio.run(cycle())
+
+
+class LocalPollCycle(object):
+    """One poll of every LAN sensor device."""
+
+    params = [[1, 10, 50], [0.0, 0.05]]
+    param_names = ['sensors', 'latency']
+
+    def setup(self, sensors, latency):
+        self.server = FakePurpleAir(sensors, latency).start()
+        self.plugin = support.make_plugin(self.server)
+        self.devices = support.add_sensors(self.plugin, self.server, sensors, local=True)
+        self.keys = list(self.plugin.localDevices)
+
+    def teardown(self, sensors, latency):
+        support.remove_devices(self.plugin, self.devices)
+        self.plugin.shutdown()
+        self.server.stop()
+
+    def time_local_poll_cycle(self, sensors, latency):
+        self.plugin.pollDue(self.keys)
+
+
+class ProcessReply(object):
+    """Parsing and processing of one group reply, without any HTTP.  The response
+    cache is reset each time so every row goes through the full reading path."""
+
+    params = [[100, 500]]
+    param_names = ['sensors']
+
+    def setup(self, sensors):
+        import requests
+        from cache import ResponseCache
+
+        self.server = FakePurpleAir(sensors)
+        self.plugin = support.make_plugin(self.server.start())
+        self.devices = support.add_sensors(self.plugin, self.server, sensors)
+        self.chunk = list(self.plugin.sensorDevices)
+        self.response = requests.Response()
+        self.response.status_code = 200
+        self.response._content = json.dumps(self.server.sensors.sensors(self.plugin.apiFields, self.chunk)).encode('utf-8')
+        self.response.encoding = 'utf-8'
+        self.make_cache = ResponseCache
+
+    def teardown(self, sensors):
+        support.remove_devices(self.plugin, self.devices)
+        self.plugin.shutdown()
+        self.server.stop()
+
+    def time_process_sensor_reply(self, sensors):
+        self.plugin.cache = self.make_cache()
+        self.plugin.processSensorReply(self.chunk, self.response)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""A local fake of the PurpleAir API (``/v1/keys``, ``/v1/sensors``) and of a
+sensor's LAN ``/json`` endpoint, with configurable latency and sensor count.
+
+Every reply reports a newer ``last_seen`` and slightly different readings, so
+each poll cycle goes through the full parse, AQI and state write path.
+
+Like real sensors, each fake sensor's ``/json`` is served from its own
+address: :meth:`FakePurpleAir.local_host` starts an endpoint on a separate
+port for one sensor.  The API server's own ``/json`` is the first sensor.
+
+Run it standalone to point a real plugin at it::
+
+    python benchmarks/fake_purpleair.py --sensors 500 --latency 0.2
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIRST_SENSOR_INDEX = 100000
+SENSOR_SPACING = 0.01       # degrees between neighbouring fake sensors
+ORIGIN = (37.70, -122.50)
+
+
+class FakeSensors(object):
+    """Deterministic readings for ``count`` sensors laid out on a grid."""
+
+    def __init__(self, count, seed=0):
+        self.count = count
+        self.random = random.Random(seed)
+        self.ticks = itertools.count(1)
+        self.lock = threading.Lock()
+        side = max(int(count ** 0.5), 1)
+        self.positions = {FIRST_SENSOR_INDEX + i: (ORIGIN[0] + (i // side) * SENSOR_SPACING,
+                                                   ORIGIN[1] + (i % side) * SENSOR_SPACING)
+                          for i in range(count)}
+
+    def ids(self):
+        return [str(index) for index in self.positions]
+
+    def reading(self, index, tick):
+        with self.lock:
+            pm25 = round(self.random.uniform(0.0, 150.0), 1)
+            spread = self.random.uniform(-1.0, 1.0)
+        latitude, longitude = self.positions[index]
+        return {
+            'sensor_index':     index,
+            'name':             f"Fake {index}",
+            'model':            "PA-II",
+            'hardware':         "2.0+BME280+PMSX003-B+PMSX003-A",
+            'firmware_version': "7.02",
+            'latitude':         latitude,
+            'longitude':        longitude,
+            'altitude':         120,
+            'rssi':             -60,
+            'uptime':           tick * 120,
+            'last_seen':        int(time.time()) + tick,
+            'temperature':      70 + tick % 5,
+            'humidity':         40 + tick % 7,
+            'pressure':         1012.5,
+            'pm1.0':            round(pm25 * 0.7, 1),
+            'pm2.5':            pm25,
+            'pm2.5_a':          round(pm25 + spread, 1),
+            'pm2.5_b':          round(pm25 - spread, 1),
+            'pm2.5_cf_1':       round(pm25 * 1.1, 1),
+            'pm10.0':           round(pm25 * 1.3, 1),
+        }
+
+    def sensors(self, fields, show_only=None, box=None):
+        tick = next(self.ticks)
+        if show_only is not None:
+            indexes = [int(index) for index in show_only if int(index) in self.positions]
+        else:
+            indexes = list(self.positions)
+        if box is not None:
+            (nwlat, nwlng, selat, selng) = box
+            indexes = [index for index in indexes
+                       if selat <= self.positions[index][0] <= nwlat and nwlng <= self.positions[index][1] <= selng]
+        fields = ['sensor_index'] + [field for field in fields if field != 'sensor_index']
+        rows = []
+        for index in indexes:
+            reading = self.reading(index, tick)
+            rows.append([reading.get(field) for field in fields])
+        return {'api_version': "V1.0.11-0.0.42", 'time_stamp': int(time.time()), 'fields': fields, 'data': rows}
+
+    def local(self, index):
+        tick = next(self.ticks)
+        reading = self.reading(index, tick)
+        return {
+            'SensorId':             f"fake:{index}",
+            'DateTime':             time.strftime("%Y/%m/%dT%H:%M:%Sz", time.gmtime(reading['last_seen'])),
+            'lat':                  reading['latitude'],
+            'lon':                  reading['longitude'],
+            'rssi':                 reading['rssi'],
+            'uptime':               reading['uptime'],
+            'version':              reading['firmware_version'],
+            'hardwarediscovered':   reading['hardware'],
+            'current_temp_f':       reading['temperature'],
+            'current_humidity':     reading['humidity'],
+            'pressure':             reading['pressure'],
+            'pm1_0_atm':            reading['pm1.0'],
+            'pm2_5_atm':            reading['pm2.5_a'],
+            'pm2_5_atm_b':          reading['pm2.5_b'],
+            'pm10_0_atm':           reading['pm10.0'],
+            'pm2_5_cf_1':           reading['pm2.5_cf_1'],
+        }
+
+
+class FakePurpleAirHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"      # keep-alive, like the real API
+    disable_nagle_algorithm = True      # headers and body are separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        server.requests += 1
+
+        if url.path == '/json':
+            # LAN endpoint, the sensor is the one this address belongs to
+            return self.reply(200, server.sensors.local(server.sensor_index))
+
+        if self.headers.get('X-API-Key') != server.api_key:
+            return self.reply(403, {'error': "ApiKeyInvalidError"})
+        if url.path == '/v1/keys':
+            return self.reply(200, {'api_key_type': "READ"})
+        if url.path == '/v1/sensors':
+            fields = query.get('fields', "").split(',')
+            show_only = query['show_only'].split(',') if 'show_only' in query else None
+            box = None
+            if 'nwlat' in query:
+                box = tuple(float(query[key]) for key in ('nwlat', 'nwlng', 'selat', 'selng'))
+            return self.reply(200, server.sensors.sensors(fields, show_only, box))
+        return self.reply(404, {'error': "NotFoundError"})
+
+
+class FakeServer(ThreadingHTTPServer):
+    """HTTP server on localhost, started on a free port in a daemon thread."""
+
+    daemon_threads = True
+
+    def __init__(self, sensors, sensor_index=FIRST_SENSOR_INDEX, latency=0.0, api_key=None, port=0):
+        super().__init__(('127.0.0.1', port), FakePurpleAirHandler)
+        self.sensors = sensors
+        self.sensor_index = sensor_index    # the sensor whose /json this address serves
+        self.latency = latency
+        self.api_key = api_key
+        self.requests = 0
+        self.thread = None
+
+    @property
+    def host(self):
+        return f"{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="fake-purpleair", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakePurpleAir(FakeServer):
+    """Fake API server, plus a LAN endpoint per sensor on demand."""
+
+    def __init__(self, sensors=100, latency=0.0, api_key="bench-read-key", port=0):
+        super().__init__(FakeSensors(sensors), latency=latency, api_key=api_key, port=port)
+        self.endpoints = {}     # sensor index -> FakeServer serving its /json
+        self.endpoints_lock = threading.Lock()
+
+    @property
+    def api_base(self):
+        return f"http://{self.host}/v1"
+
+    def local_host(self, sensor_id):
+        """Address of the LAN endpoint of one sensor, started on first use."""
+        index = int(sensor_id)
+        with self.endpoints_lock:
+            if index not in self.endpoints:
+                self.endpoints[index] = FakeServer(self.sensors, index, self.latency).start()
+            return self.endpoints[index].host
+
+    def stop(self):
+        with self.endpoints_lock:
+            for endpoint in self.endpoints.values():
+                endpoint.stop()
+            self.endpoints.clear()
+        super().stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake PurpleAir API server")
+    parser.add_argument('--sensors', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every reply")
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    server = FakePurpleAir(args.sensors, args.latency, port=args.port)
+    print(f"serving {args.sensors} fake sensors on {server.api_base}, API key {server.api_key}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Minimal stand-in for the ``indigo`` module that the Indigo server injects
+into plugins, so that :class:`plugin.Plugin` can be driven from the benchmarks.
+
+Only what the plugin touches is provided.  Devices are plain objects kept in
+:data:`devices`; state writes are applied to ``device.states`` and counted.
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+THREADDEBUG = 5
+logging.addLevelName(THREADDEBUG, "THREADDEBUG")
+
+
+class Dict(dict):
+    pass
+
+
+class List(list):
+    pass
+
+
+class Device(object):
+
+    def __init__(self, id, name, deviceTypeId, address="", pluginProps=None):
+        self.id = id
+        self.name = name
+        self.deviceTypeId = deviceTypeId
+        self.address = address
+        self.pluginProps = Dict(pluginProps or {})
+        self.states = Dict()
+        self.errorState = None
+        self.writes = 0
+
+    def updateStatesOnServer(self, state_list):
+        self.writes += 1
+        for state in state_list:
+            self.states[state['key']] = state['value']
+
+    def setErrorStateOnServer(self, message):
+        self.errorState = message
+
+    def stateListOrDisplayStateIdChanged(self):
+        pass
+
+
+class DeviceList(dict):
+
+    def add(self, device):
+        self[device.id] = device
+        return device
+
+
+class _Server(object):
+
+    def getLogsFolderPath(self, pluginId=None):
+        return tempfile.gettempdir()
+
+    def log(self, message, *args, **kwargs):
+        logging.getLogger("Plugin").info(message)
+
+
+class _Trigger(object):
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, trigger):
+        self.executed.append(getattr(trigger, 'id', trigger))
+
+
+devices = DeviceList()
+triggers = DeviceList()
+server = _Server()
+trigger = _Trigger()
+
+
+class PluginBase(object):
+
+    class StopThread(Exception):
+        pass
+
+    def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
+        self.pluginId = pluginId
+        self.pluginDisplayName = pluginDisplayName
+        self.pluginVersion = pluginVersion
+        self.pluginPrefs = Dict(pluginPrefs)
+        self.stopThread = False
+
+        self.logger = logging.getLogger("Plugin")
+        self.logger.threaddebug = lambda msg, *args, **kwargs: self.logger.log(THREADDEBUG, msg, *args, **kwargs)
+        self.plugin_file_handler = logging.StreamHandler()
+        self.indigo_log_handler = logging.StreamHandler()
+        if os.environ.get('BENCH_LOG'):
+            self.logger.addHandler(self.indigo_log_handler)
+
+    def sleep(self, seconds):
+        if self.stopThread:
+            raise self.StopThread()
+        time.sleep(seconds)
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run the benchmarks and save or compare asv-style results.
+
+Benchmarks follow the asv conventions: classes in ``bench_*.py`` modules with
+``time_*`` methods, optional ``setup``/``teardown`` and ``params`` /
+``param_names`` for a parameter grid.  A ``setup`` that raises
+``NotImplementedError`` skips that combination.
+
+Usage::
+
+    python benchmarks/run.py                          # run all, save results/<commit>.json
+    python benchmarks/run.py -b IAQI -b Registry      # only names containing these
+    python benchmarks/run.py --compare benchmarks/results/1a2b3c4d.json
+"""
+
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+
+import support
+
+RESULTS_DIR = os.path.join(support.HERE, "results")
+DEFAULT_REPEAT = 5
+SLOWER = 1.10
+FASTER = 0.90
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=support.HERE, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def discover():
+    """Yield (module name, class) for every benchmark class."""
+    for filename in sorted(os.listdir(support.HERE)):
+        if not (filename.startswith('bench_') and filename.endswith('.py')):
+            continue
+        module = importlib.import_module(filename[:-3])
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and any(attr.startswith('time_') for attr in dir(cls)):
+                yield module.__name__, cls
+
+
+def measure(func, args, repeat):
+    timer = timeit.Timer(lambda: func(*args))
+    number, _ = timer.autorange()
+    times = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {'min': min(times), 'median': statistics.median(times), 'number': number, 'repeat': repeat}
+
+
+def run(filters, repeat):
+    results = {}
+    for module_name, cls in discover():
+        params = getattr(cls, 'params', [])
+        methods = sorted(attr for attr in dir(cls) if attr.startswith('time_'))
+        for combo in itertools.product(*params):
+            label = f"({', '.join(repr(value) for value in combo)})" if combo else ""
+            names = {method: f"{module_name}.{cls.__name__}.{method}{label}" for method in methods}
+            if filters and not any(f in name for name in names.values() for f in filters):
+                continue
+            bench = cls()
+            try:
+                if hasattr(bench, 'setup'):
+                    bench.setup(*combo)
+            except NotImplementedError:
+                continue
+            try:
+                for method, name in names.items():
+                    if filters and not any(f in name for f in filters):
+                        continue
+                    result = measure(getattr(bench, method), combo, repeat)
+                    results[name] = result
+                    print(f"{name:<80} {format_time(result['min']):>10}")
+            finally:
+                if hasattr(bench, 'teardown'):
+                    bench.teardown(*combo)
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f}{unit}"
+    return f"{seconds / 1e-9:.1f}ns"
+
+
+def compare(baseline, results):
+    print(f"\n{'benchmark':<80} {'before':>10} {'after':>10} {'ratio':>7}")
+    for name in sorted(results):
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['min']
+        after = results[name]['min']
+        ratio = after / before
+        flag = " slower" if ratio > SLOWER else " faster" if ratio < FASTER else ""
+        print(f"{name:<80} {format_time(before):>10} {format_time(after):>10} {ratio:>7.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="miniPurple benchmarks")
+    parser.add_argument('-b', '--bench', action='append', default=[], help="only run benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--compare', metavar='RESULTS', help="results file to compare against")
+    parser.add_argument('--output', metavar='RESULTS', help="where to save the results (default results/<commit>.json)")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = run(args.bench, args.repeat)
+    document = {
+        'commit':   commit,
+        'date':     datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine':  platform.node(),
+        'python':   platform.python_version(),
+        'platform': platform.platform(),
+        'results':  results,
+    }
+    if not args.no_save:
+        output = args.output or os.path.join(RESULTS_DIR, f"{commit[:8]}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as results_file:
+            json.dump(document, results_file, indent=2, sort_keys=True)
+        print(f"\nresults saved to {output}")
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Shared set-up for the benchmarks: puts the plugin and the ``indigo`` stub
+on ``sys.path`` and builds a :class:`plugin.Plugin` wired to a fake server.
+"""
+
+import builtins
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(os.path.dirname(HERE), "miniPurple.indigoPlugin", "Contents", "Server Plugin")
+
+for path in (HERE, PLUGIN_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import indigo                                   # noqa: E402  the stub in this directory
+
+builtins.indigo = indigo                        # the Indigo server provides it as a builtin
+
+PLUGIN_ID = "com.flyingdiver.indigoplugin.miniPurple"
+
+
+def make_plugin(server, prefs=None):
+    """Return a Plugin whose API requests go to the fake server."""
+    import poller
+    import plugin
+
+    poller.API_BASE = server.api_base
+    plugin_prefs = {
+        'apiReadKey':   server.api_key,
+        'logLevel':     "30",
+    }
+    plugin_prefs.update(prefs or {})
+    instance = plugin.Plugin(PLUGIN_ID, "miniPurple", "bench", plugin_prefs)
+    instance.startup()
+    instance.keyCheck.result(instance.apiReadKey)      # wait for the background key check
+    return instance
+
+
+def add_sensors(instance, server, count, local=False):
+    """Create and start ``count`` sensor devices for the fake server's sensors."""
+    devices = []
+    for sensor_id in server.sensors.ids()[:count]:
+        dev_id = len(indigo.devices) + 1
+        props = {'address': sensor_id}
+        if local:
+            props.update({'useLocal': True, 'localAddress': server.local_host(sensor_id), 'localUpdateFrequency': "30"})
+        device = indigo.devices.add(indigo.Device(dev_id, f"Sensor {sensor_id}", 'purpleSensor', sensor_id, props))
+        instance.deviceStartComm(device)
+        devices.append(device)
+    return devices
+
+
+def remove_devices(instance, devices):
+    for device in devices:
+        instance.deviceStopComm(device)
+        indigo.devices.pop(device.id, None)
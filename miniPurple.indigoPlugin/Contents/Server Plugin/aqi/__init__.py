@@ -1,11 +1,10 @@
 # -*- coding: utf-8 -*-
 
-import argparse
-
 from aqi.constants import (POLLUTANT_PM25, POLLUTANT_PM10,
                           POLLUTANT_O3_8H, POLLUTANT_O3_1H,
                           POLLUTANT_CO_8H, POLLUTANT_SO2_1H,
-                          POLLUTANT_NO2_1H, ALGO_EPA, ALGO_MEP)
+                          POLLUTANT_NO2_1H, ALGO_EPA, ALGO_MEP,
+                          ALGO_EPA_NOWCAST, ALGO_EPA_PURPLEAIR)
 
 from aqi.algos import get_algo, list_algos
 
@@ -32,6 +31,20 @@ def to_iaqi(elem, cc, algo=ALGO_EPA):
     _aqi = get_algo(algo)
     return _aqi.iaqi(elem, cc)
 
+def to_iaqi_many(elem, ccs, algo=ALGO_EPA):
+    """Calculate the intermediate AQIs for a sequence of concentrations of
+    a given pollutant in one call. Uses NumPy when it is available.
+
+    :param elem: pollutant constant
+    :type elem: int
+    :param ccs: pollutant contentrations (µg/m³ or ppm)
+    :type ccs: list or numpy.ndarray
+    :param algo: algorithm module canonical name
+    :type algo: str
+    """
+    _aqi = get_algo(algo)
+    return _aqi.iaqi_many(elem, ccs)
+
 def to_aqi(ccs, algo=ALGO_EPA):
     """Calculate the AQI based on a list of pollutants
 
@@ -44,6 +57,19 @@ def to_aqi(ccs, algo=ALGO_EPA):
     _aqi = get_algo(algo)
     return _aqi.aqi(ccs)
 
+def to_aqi_many(stations, algo=ALGO_EPA):
+    """Calculate the AQI of many stations in one call. Return a list of
+    int, None for stations with no pollutant covered by the algorithm.
+
+    :param stations: a list with, for each station, a list of tuples of
+                     pollutant constant and concentration
+    :type stations: list
+    :param algo: algorithm module name
+    :type algo: str
+    """
+    _aqi = get_algo(algo)
+    return _aqi.aqi_many(stations)
+
 def to_cc(elem, iaqi, algo=ALGO_EPA):
     """Calculate a concentration for a given pollutant.
 
@@ -76,6 +102,18 @@ def console_aqi():
                              'corresponding pollutants')
     parser.add_argument('-v', action='store_true', dest='verbose',
                         help='add IAQIs to the result')
+    parser.add_argument('-f', dest='file', metavar='FILE',
+                        help='batch mode: convert every row of a CSV or '
+                             'NDJSON file, - for stdin')
+    parser.add_argument('--format', dest='format', choices=['csv', 'ndjson'],
+                        help='batch input and output format, guessed from '
+                             'the file name by default')
+    parser.add_argument('-o', dest='output', metavar='FILE',
+                        help='batch output file, defaults to stdout')
+    parser.add_argument('-j', dest='jobs', type=int, default=1,
+                        help='batch worker processes, defaults to 1')
+    parser.add_argument('--chunk-size', dest='chunk_size', type=int,
+                        default=2000, help='batch rows per chunk')
     parser.add_argument('algo', nargs='?',
                         help='the formula to use for the AQI '
                              'calculation, use the python module path')
@@ -92,6 +130,15 @@ def console_aqi():
                 algo=_algo[0], elem=', '.join(
                 ["{0} ({1})".format(elem, unit) for (elem, unit) \
                  in _algo[1]])))
+    elif args.file is not None:
+        from aqi.batch import run_batch
+        if args.algo is None or get_algo(args.algo) is None:
+            sys.stderr.write("Missing or unknown algorithm.\n")
+            parser.print_help()
+            sys.exit(1)
+        run_batch(args.algo, args.file, conv=args.conv, fmt=args.format,
+                  output=args.output, jobs=args.jobs,
+                  chunk_size=args.chunk_size, verbose=args.verbose)
     else:
         # if not listing but missing other positional argument
         if args.algo is None or args.measures is None:
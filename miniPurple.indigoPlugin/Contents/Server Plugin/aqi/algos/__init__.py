@@ -1,38 +1,109 @@
 # -*- coding: utf-8 -*-
+import importlib
 import pkgutil
+import threading
 
+ENTRY_POINT_GROUP = 'aqi.algos'
 
-def get_algo(algo_mod):
-    """Instanciate an AQI algorithm class. If there is a problem during
-    the import or instanciation, return None.
+# shared AQI instances keyed by algorithm canonical name. AQI classes keep
+# no per-instance state, so one precompiled instance serves every caller.
+_registry = {}
+_unknown = set()
+_discovered = False
+_lock = threading.RLock()
 
-    :param algo_mod: algorithm module canonical name
-    :type algo_mod: str
+
+def register_algo(name, algo_class):
+    """Register an AQI algorithm class under a canonical name and return
+    its shared instance. Third-party algorithms can call this directly or
+    be advertised through the 'aqi.algos' entry point group.
+
+    :param name: algorithm canonical name
+    :type name: str
+    :param algo_class: a :class:`aqi.algos.base.BaseAQI` subclass
+    :type algo_class: type
+    """
+    _aqi = algo_class()
+    # build the breakpoint tables now rather than on the first reading
+    if getattr(_aqi, 'piecewise', None) is not None and hasattr(_aqi, 'compiled'):
+        for elem in _aqi.piecewise['bp']:
+            _aqi.compiled(elem)
+    with _lock:
+        _registry[name] = _aqi
+        _unknown.discard(name)
+    return _aqi
+
+def _import_algo(algo_mod):
+    """Import an algorithm module and register its AQI class. Return the
+    shared instance or None.
     """
-    # try to import the algorithm module
     try:
-        mod = __import__(algo_mod, fromlist=[algo_mod])
+        mod = importlib.import_module(algo_mod)
     except ImportError:
         return None
-
-    # try to instanciate an AQI class
     try:
-        return mod.AQI()
+        return register_algo(algo_mod, mod.AQI)
     except AttributeError:
         return None
 
+def _discover():
+    """Register the algorithms shipped in this package and those
+    advertised by entry points, once per process.
+    """
+    global _discovered
+    with _lock:
+        if _discovered:
+            return
+        _discovered = True
+
+        algos_pkg = 'aqi.algos'
+        package = importlib.import_module(algos_pkg)
+        for importer, modname, ispkg in pkgutil.iter_modules(package.__path__):
+            if ispkg is False and modname != 'base':
+                _import_algo('.'.join([algos_pkg, modname]))
+
+        try:
+            from importlib.metadata import entry_points
+            eps = entry_points()
+            eps = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') \
+                else eps.get(ENTRY_POINT_GROUP, [])
+        except ImportError:
+            eps = []
+        for ep in eps:
+            try:
+                obj = ep.load()
+                register_algo(ep.name, getattr(obj, 'AQI', obj))
+            except Exception:
+                continue
+
+def get_algo(algo_mod):
+    """Return the shared AQI instance of an algorithm. If there is a
+    problem during the import or instanciation, return None.
+
+    :param algo_mod: algorithm module canonical name
+    :type algo_mod: str
+    """
+    _aqi = _registry.get(algo_mod)
+    if _aqi is not None:
+        return _aqi
+
+    with _lock:
+        _discover()
+        if algo_mod in _registry:
+            return _registry[algo_mod]
+        if algo_mod in _unknown:
+            return None
+        # not discovered, try it as a module path
+        _aqi = _import_algo(algo_mod)
+        if _aqi is None:
+            _unknown.add(algo_mod)
+        return _aqi
+
 def list_algos():
     """Return a list of available algorithms with corresponding
     pollutant
     """
-    _algos = []
-    algos_pkg = 'aqi.algos'
-
-    package = __import__(algos_pkg, fromlist=[algos_pkg])
-    for importer, modname, ispkg in pkgutil.iter_modules(package.__path__):
-        if ispkg is False and modname != 'base':
-            algo_mod = '.'.join([algos_pkg, modname])
-            mod = __import__(algo_mod, fromlist=[algo_mod])
-            _aqi = mod.AQI()
-            _algos.append((mod.__name__, _aqi.list_pollutants()))
-    return _algos
+    _discover()
+    with _lock:
+        return [(name, _aqi.list_pollutants())
+                for (name, _aqi) in _registry.items()]
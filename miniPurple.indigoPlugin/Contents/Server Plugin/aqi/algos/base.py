@@ -1,6 +1,31 @@
 # -*- coding: utf-8 -*-
 
+from bisect import bisect_right
 from decimal import *
+from functools import lru_cache
+from math import isfinite
+
+# NumPy is slow to import and only the array paths need it, see load_numpy()
+numpy = None
+_numpy_checked = False
+
+# quantized concentrations remembered per pollutant table
+MEMO_SIZE = 4096
+
+
+def load_numpy():
+    """Import NumPy on first use. Return the module, or None if it isn't
+    installed.
+    """
+    global numpy, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = None
+        numpy = _numpy
+        _numpy_checked = True
+    return numpy
 
 
 class BaseAQI(object):
@@ -20,10 +45,30 @@ class BaseAQI(object):
         """
         raise NotImplementedError
 
+    def iaqi_many(self, elem, ccs):
+        """Calculate the intermediate AQIs for a sequence of
+        concentrations of one pollutant. Return a list of int, whether or
+        not NumPy is available, or None if the pollutant isn't covered by
+        the algorithm.
+
+        :param elem: pollutant constant
+        :type elem: int
+        :param ccs: pollutant concentrations (µg/m³ or ppm)
+        :type ccs: list or numpy.ndarray
+        """
+        _iaqis = [self.iaqi(elem, cc) for cc in ccs]
+        if None in _iaqis:
+            return None
+        return [int(_iaqi) for _iaqi in _iaqis]
+
     def aqi(self, ccs, iaqis=False):
         """Calculate the AQI based on a list of pollutants. Return an
         AQI value, if `iaqis` is set to True, send back a tuple
-        containing the AQI and a dict of IAQIs.
+        containing the AQI and a dict of IAQIs. The AQI is None when no
+        pollutant of the list is covered by the algorithm.
+
+        Every concentration is evaluated, so a bad one raises whatever
+        its place in the list.
 
         :param ccs: a list of tuples of pollutants concentrations with
                     pollutant constant and concentration as values
@@ -31,16 +76,38 @@ class BaseAQI(object):
         :param iaqis: return IAQIs with result
         :type iaqis: bool
         """
-        _iaqis = {}
-        for (elem, cc) in ccs:
-            _iaqi = self.iaqi(elem, cc)
-            if _iaqi is not None:
-                _iaqis[elem] = _iaqi
-        _aqi = max(_iaqis.values())
+        # the last concentration given for a pollutant wins
+        measures = dict(ccs)
         if iaqis:
+            _iaqis = {}
+            for (elem, cc) in measures.items():
+                _iaqi = self.iaqi(elem, cc)
+                if _iaqi is not None:
+                    _iaqis[elem] = _iaqi
+            _aqi = max(_iaqis.values()) if _iaqis else None
             return (_aqi, _iaqis)
-        else:
-            return _aqi
+
+        _aqi = None
+        for (elem, cc) in measures.items():
+            _iaqi = self.iaqi(elem, cc)
+            if _iaqi is not None and (_aqi is None or _iaqi > _aqi):
+                _aqi = _iaqi
+        return _aqi
+
+    def aqi_many(self, stations):
+        """Calculate the AQI of many stations at once. Return a list of
+        int with one AQI per station, None for stations with no pollutant
+        covered by the algorithm.
+
+        :param stations: a list with, for each station, a list of tuples
+                         of pollutant constant and concentration
+        :type stations: list
+        """
+        result = []
+        for ccs in stations:
+            _aqi = self.aqi(ccs)
+            result.append(None if _aqi is None else int(_aqi))
+        return result
 
     def cc(self, elem, iaqi):
         """Calculate a concentration for a given pollutant. Return the
@@ -73,6 +140,95 @@ class PiecewiseAQI(BaseAQI):
         if elem not in self.piecewise['bp'].keys():
             return None
 
+        table = self.compiled(elem)
+        if table is not None:
+            value = table.lookup(cc)
+            if value is not None:
+                return value
+        return self.decimal_iaqi(elem, cc)
+
+    def iaqi_many(self, elem, ccs):
+        if self.piecewise is None:
+            raise NameError("piecewise struct is not defined")
+        if elem not in self.piecewise['bp'].keys():
+            return None
+
+        table = self.compiled(elem)
+        if load_numpy() is None or table is None:
+            return [int(self.iaqi(elem, cc)) for cc in ccs]
+
+        try:
+            values = numpy.asarray(ccs, dtype=float)
+        except (ValueError, TypeError):
+            # non numeric input, let the scalar path raise what iaqi() raises
+            return [int(self.iaqi(elem, cc)) for cc in ccs]
+        result = table.iaqi_array(values).tolist()
+        # whatever the array path couldn't answer exactly goes through the
+        # scalar path
+        for (i, value) in enumerate(result):
+            if value < 0:
+                result[i] = int(self.iaqi(elem, ccs[i]))
+        return result
+
+    def compiled(self, elem):
+        """Return the compiled breakpoint table for a pollutant, or None if
+        the breakpoints can't be compiled. Tables are built once per class
+        and shared by every instance.
+        """
+        tables = type(self).__dict__.get('_compiled')
+        if tables is None:
+            tables = {}
+            setattr(type(self), '_compiled', tables)
+        if elem not in tables:
+            tables[elem] = CompiledBreakpoints.build(self.piecewise, elem)
+        return tables[elem]
+
+    def aqi_many(self, stations):
+        if self.piecewise is None:
+            raise NameError("piecewise struct is not defined")
+        # resolve the table of every pollutant once for the whole batch,
+        # False for pollutants the algorithm doesn't cover
+        resolved = {}
+        result = []
+        for ccs in stations:
+            _aqi = None
+            for (elem, cc) in dict(ccs).items():
+                if elem not in resolved:
+                    resolved[elem] = self.compiled(elem) \
+                        if elem in self.piecewise['bp'] else False
+                table = resolved[elem]
+                if table is False:
+                    continue
+                _iaqi = table.lookup(cc) if table is not None else None
+                if _iaqi is None:
+                    _iaqi = self.decimal_iaqi(elem, cc)
+                if _aqi is None or _iaqi > _aqi:
+                    _aqi = _iaqi
+            result.append(None if _aqi is None else int(_aqi))
+        return result
+
+    def inverse(self, elem):
+        """Return the concentration for every integer IAQI of a pollutant,
+        indexed by IAQI, None where the reference implementation fails.
+        Built on first use, once per class.
+        """
+        tables = type(self).__dict__.get('_inverse')
+        if tables is None:
+            tables = {}
+            setattr(type(self), '_inverse', tables)
+        table = tables.get(elem)
+        if table is None:
+            table = []
+            for _iaqi in range(self.piecewise['aqi'][-1][1] + 1):
+                try:
+                    table.append(self.decimal_cc(elem, _iaqi))
+                except (ArithmeticError, IndexError, TypeError):
+                    table.append(None)
+            tables[elem] = table
+        return table
+
+    def decimal_iaqi(self, elem, cc):
+        """Reference implementation of :meth:`iaqi`, in Decimal arithmetic."""
         _cc = Decimal(cc).quantize(self.piecewise['prec'][elem],
                                    rounding=ROUND_DOWN)
 
@@ -102,7 +258,13 @@ class PiecewiseAQI(BaseAQI):
             return None
 
         _iaqi = int(iaqi)
+        table = self.inverse(elem)
+        if 0 <= _iaqi < len(table) and table[_iaqi] is not None:
+            return table[_iaqi]
+        return self.decimal_cc(elem, _iaqi)
 
+    def decimal_cc(self, elem, _iaqi):
+        """Reference implementation of :meth:`cc`, in Decimal arithmetic."""
         # define aqi breakpoints for this pollutant at this IAQI
         bps = self.piecewise['aqi']
         bplo = None
@@ -124,3 +286,163 @@ class PiecewiseAQI(BaseAQI):
 
     def list_pollutants(self):
         return self.piecewise['units'].items()
+
+
+class CompiledBreakpoints(object):
+    """Breakpoint table for one pollutant of a :class:`PiecewiseAQI`,
+    compiled to integers counted in units of the pollutant precision.
+
+    Lookup is a bisect over the sorted lower edges and the interpolation is
+    done in exact integer arithmetic, so results are identical to the
+    Decimal implementation. Inputs the table can't answer exactly (exact
+    .5 ties, values outside every range, degenerate ranges, unsupported
+    types) return None and are left to the Decimal implementation.
+
+    :meth:`lookup` adds a full table of results indexed by quantized
+    concentration, built on first use, and a bounded LRU memo of
+    quantized concentrations.
+    """
+
+    __slots__ = ('prec', 'scale', 'exp', 'los', 'segments', 'blocked',
+                 'forward', 'memo')
+
+    def __init__(self, prec, exp, segments, blocked):
+        self.prec = prec
+        self.scale = 10 ** exp
+        self.exp = exp
+        self.los = [seg[0] for seg in segments]
+        self.segments = segments
+        self.blocked = blocked
+        self.forward = None
+        self.memo = lru_cache(maxsize=MEMO_SIZE)(self.quantize)
+
+    @classmethod
+    def build(cls, piecewise, elem):
+        prec = piecewise['prec'][elem]
+        exp = -prec.as_tuple().exponent
+        if exp < 0 or prec != Decimal(1).scaleb(-exp):
+            return None
+
+        segments = []
+        blocked = set()
+        for idx, (bplo, bphi) in enumerate(piecewise['bp'][elem]):
+            lo = Decimal(bplo).scaleb(exp)
+            hi = Decimal(bphi).scaleb(exp)
+            if lo != lo.to_integral_value() or hi != hi.to_integral_value():
+                return None
+            lo, hi = int(lo), int(hi)
+            if hi <= lo or idx >= len(piecewise['aqi']):
+                # the Decimal implementation fails on these, let it
+                blocked.update(range(lo, hi + 1))
+                continue
+            (aqilo, aqihi) = piecewise['aqi'][idx]
+            segments.append((lo, hi, aqilo, aqihi - aqilo))
+
+        for prev, seg in zip(segments, segments[1:]):
+            if seg[0] <= prev[1]:
+                return None
+        return cls(prec, exp, segments, blocked)
+
+    def quantize(self, cc):
+        """Concentration as an integer number of precision units, rounded
+        towards zero like ``Decimal.quantize(..., rounding=ROUND_DOWN)``.
+        """
+        if type(cc) is float:
+            if not isfinite(cc):
+                return None
+            (num, den) = cc.as_integer_ratio()
+            if num >= 0:
+                return num * self.scale // den
+            return -(-num * self.scale // den)
+        if type(cc) is int:
+            return cc * self.scale
+        try:
+            _cc = Decimal(cc).quantize(self.prec, rounding=ROUND_DOWN)
+            return int(_cc.scaleb(self.exp))
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+
+    def iaqi_array(self, values):
+        """Vectorized :meth:`iaqi` over a float :class:`numpy.ndarray`.
+        Return an int64 array where -1 marks the values that need the
+        scalar path: non finite, out of range, exact ties, or too close to
+        a quantization step for float math to decide.
+        """
+        scaled = values * self.scale
+        unsure = ~numpy.isfinite(scaled)
+        scaled[unsure] = 0.0
+        unsure |= numpy.abs(scaled - numpy.rint(scaled)) < 1e-6
+        unsure |= scaled < 0
+        n = numpy.trunc(scaled).astype(numpy.int64)
+
+        segments = numpy.array(self.segments, dtype=numpy.int64).reshape(-1, 4)
+        idx = numpy.searchsorted(segments[:, 0], n, side='right') - 1
+        unsure |= idx < 0
+        (lo, hi, aqilo, span) = segments[numpy.maximum(idx, 0)].T
+        unsure |= n > hi
+        if self.blocked:
+            unsure |= numpy.isin(n, list(self.blocked))
+
+        (q, r) = numpy.divmod(span * (n - lo), numpy.maximum(hi - lo, 1))
+        r2 = 2 * r
+        q += r2 > (hi - lo)
+        unsure |= r2 == (hi - lo)
+
+        result = aqilo + q
+        result[unsure] = -1
+        return result
+
+    def build_forward(self):
+        """Precompute :meth:`iaqi_units` for every quantized concentration
+        covered by the breakpoints.
+        """
+        results = {}
+        forward = []
+        for n in range(self.segments[-1][1] + 1 if self.segments else 0):
+            value = self.iaqi_units(n)
+            if value is not None:
+                value = results.setdefault(value, value)
+            forward.append(value)
+        self.forward = forward
+        return forward
+
+    def lookup(self, cc):
+        """Same as :meth:`iaqi`, read from the precomputed table."""
+        try:
+            n = self.memo(cc)
+        except TypeError:
+            n = self.quantize(cc)
+        if n is None or n < 0:
+            return None
+        forward = self.forward
+        if forward is None:
+            forward = self.build_forward()
+        if n < len(forward):
+            return forward[n]
+        return None
+
+    def iaqi(self, cc):
+        n = self.quantize(cc)
+        if n is None:
+            return None
+        return self.iaqi_units(n)
+
+    def iaqi_units(self, n):
+        """IAQI of a concentration counted in precision units."""
+        if n in self.blocked:
+            return None
+        idx = bisect_right(self.los, n) - 1
+        if idx < 0:
+            return None
+        (lo, hi, aqilo, span) = self.segments[idx]
+        if n > hi:
+            return None
+
+        # aqilo + span * (n - lo) / (hi - lo), rounded half to even
+        (q, r) = divmod(span * (n - lo), hi - lo)
+        r2 = 2 * r
+        if r2 > hi - lo:
+            q += 1
+        elif r2 == hi - lo:
+            return None
+        return Decimal(aqilo + q)
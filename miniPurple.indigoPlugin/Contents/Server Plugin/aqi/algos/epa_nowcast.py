@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from aqi.algos import epa
+
+
+class AQI(epa.AQI):
+    """Implementation of the EPA AQI algorithm on NowCast concentrations.
+
+    The breakpoints are the EPA ones, the concentrations passed to
+    :meth:`iaqi` are expected to be NowCast averages, see :class:`NowCast`.
+    """
+
+
+class NowCast(object):
+    """Streaming EPA NowCast for particulate matter.
+
+    Readings are accumulated into hourly buckets as they arrive, so
+    :meth:`update` is O(1). :meth:`value` weights the last 12 hourly
+    averages, a fixed amount of work whatever the reading rate.
+
+    :param hours: number of hourly averages in the window
+    :type hours: int
+    :param min_weight: lowest weight factor, 0.5 for PM
+    :type min_weight: float
+    """
+
+    def __init__(self, hours=12, min_weight=0.5):
+        self.hours = hours
+        self.min_weight = min_weight
+        self.sums = [0.0] * hours
+        self.counts = [0] * hours
+        self.current = None     # hour number of the newest bucket
+
+    def update(self, timestamp, cc):
+        """Add a concentration reading taken at timestamp (seconds since
+        the epoch). Readings older than the window are ignored.
+        """
+        hour = int(timestamp // 3600)
+        if self.current is None:
+            self.current = hour
+        elif hour > self.current:
+            # clear the buckets for the hours that went by
+            for h in range(self.current + 1, min(hour, self.current + self.hours) + 1):
+                self.sums[h % self.hours] = 0.0
+                self.counts[h % self.hours] = 0
+            self.current = hour
+        elif hour <= self.current - self.hours:
+            return
+        self.sums[hour % self.hours] += float(cc)
+        self.counts[hour % self.hours] += 1
+
+    def averages(self):
+        """Hourly averages, newest first, None for hours without data."""
+        if self.current is None:
+            return []
+        _avgs = []
+        for i in range(self.hours):
+            h = (self.current - i) % self.hours
+            _avgs.append(self.sums[h] / self.counts[h] if self.counts[h] else None)
+        return _avgs
+
+    def value(self):
+        """Return the NowCast concentration, or None when two of the three
+        most recent hours have no data.
+        """
+        _avgs = self.averages()
+        if len([c for c in _avgs[:3] if c is not None]) < 2:
+            return None
+        valid = [c for c in _avgs if c is not None]
+        cmax = max(valid)
+        weight = min(valid) / cmax if cmax > 0 else 1.0
+        weight = max(weight, self.min_weight)
+
+        num = 0.0
+        den = 0.0
+        factor = 1.0
+        for c in _avgs:
+            if c is not None:
+                num += factor * c
+                den += factor
+            factor *= weight
+        return num / den
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+from aqi.constants import POLLUTANT_PM25
+from aqi.algos import epa
+
+
+def correct_pm25(pm25_cf1, humidity):
+    """US EPA correction of PurpleAir PM2.5 readings (2021 US-wide
+    correction, extended for smoke). Return the corrected concentration
+    in µg/m³.
+
+    :param pm25_cf1: PurpleAir PM2.5 CF=1 concentration (µg/m³), average
+                     of the A and B channels
+    :type pm25_cf1: float
+    :param humidity: PurpleAir relative humidity (%)
+    :type humidity: float
+    """
+    pa = float(pm25_cf1)
+    rh = float(humidity)
+    if pa < 30:
+        value = 0.524 * pa - 0.0862 * rh + 5.75
+    elif pa < 50:
+        f = pa / 20 - 3 / 2
+        value = (0.786 * f + 0.524 * (1 - f)) * pa - 0.0862 * rh + 5.75
+    elif pa < 210:
+        value = 0.786 * pa - 0.0862 * rh + 5.75
+    elif pa < 260:
+        f = pa / 50 - 21 / 5
+        value = (0.69 * f + 0.786 * (1 - f)) * pa - 0.0862 * rh * (1 - f) \
+            + 2.966 * f + 5.75 * (1 - f) + 8.84e-4 * pa ** 2 * f
+    else:
+        value = 2.966 + 0.69 * pa + 8.84e-4 * pa ** 2
+    return max(value, 0.0)
+
+
+class AQI(epa.AQI):
+    """Implementation of the EPA AQI algorithm on US EPA corrected
+    PurpleAir PM2.5 concentrations.
+
+    :meth:`iaqi` expects corrected concentrations, use
+    :meth:`iaqi_purpleair` to correct and convert a raw reading.
+    """
+
+    def iaqi_purpleair(self, pm25_cf1, humidity):
+        """Correct a raw PurpleAir reading and return its PM2.5 IAQI.
+
+        :param pm25_cf1: PurpleAir PM2.5 CF=1 concentration (µg/m³)
+        :type pm25_cf1: float
+        :param humidity: PurpleAir relative humidity (%)
+        :type humidity: float
+        """
+        return self.iaqi(POLLUTANT_PM25, correct_pm25(pm25_cf1, humidity))
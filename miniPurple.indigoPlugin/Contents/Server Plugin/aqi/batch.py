@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""Streaming batch conversion for the 'aqi' command.
+
+Rows of measurements are read from a CSV or NDJSON file (memory-mapped)
+or from stdin, converted in chunks, optionally across several processes,
+and written out as they complete, so memory use is bounded by the chunk
+size and the number of chunks in flight.
+
+CSV input needs a header row. Columns named after a pollutant of the
+algorithm hold its concentration (or IAQI with ``-c cc``), every other
+column is copied through. NDJSON input works the same way with the keys
+of each object.
+"""
+
+import csv
+import io
+import json
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from aqi.algos import get_algo
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+DEFAULT_CHUNK_SIZE = 2000
+IN_FLIGHT_PER_JOB = 2
+
+AQI_COLUMN = 'aqi'
+ERROR_COLUMN = 'error'
+
+
+def detect_format(path):
+    """Guess the input format from a file name, CSV unless it looks
+    like NDJSON.
+
+    :param path: input file name, or '-' for stdin
+    :type path: str
+    """
+    if path and os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl', '.json'):
+        return FORMAT_NDJSON
+    return FORMAT_CSV
+
+
+def read_lines(path):
+    """Yield the text lines of a file through a memory map, or of stdin
+    when path is '-'.
+
+    :param path: input file name, or '-' for stdin
+    :type path: str
+    """
+    if path == '-':
+        yield from io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        return
+    with open(path, 'rb') as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b''):
+                yield line.decode('utf-8')
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_measures(_aqi, conv, measures, verbose):
+    """Convert the measures of one row, return a dict of output columns.
+
+    :param _aqi: AQI algorithm instance
+    :type _aqi: :class:`aqi.algos.base.BaseAQI`
+    :param conv: 'aqi' or 'cc'
+    :type conv: str
+    :param measures: list of (pollutant constant, value) tuples
+    :type measures: list
+    :param verbose: add the IAQI of each pollutant
+    :type verbose: bool
+    """
+    if conv == 'cc':
+        return dict((elem + '_cc', _aqi.cc(elem, value)) for (elem, value) in measures)
+    (value, iaqis) = _aqi.aqi(measures, iaqis=True)
+    result = {AQI_COLUMN: None if value is None else int(value)}
+    if verbose:
+        for (elem, iaqi) in iaqis.items():
+            result[elem + '_iaqi'] = int(iaqi)
+    return result
+
+
+def convert_chunk(algo, conv, fmt, header, verbose, chunk):
+    """Convert one chunk of rows. Runs in a worker process when jobs > 1,
+    so it only takes picklable arguments. Return (output rows, errors).
+
+    :param algo: algorithm module canonical name
+    :type algo: str
+    :param fmt: 'csv' (chunk of lists of str) or 'ndjson' (chunk of lines)
+    :type fmt: str
+    :param header: CSV column names
+    :type header: list
+    """
+    _aqi = get_algo(algo)
+    pollutants = set(elem for (elem, unit) in _aqi.list_pollutants())
+    out = []
+    errors = 0
+    for row in chunk:
+        record = None
+        try:
+            if fmt == FORMAT_NDJSON:
+                if not row.strip():
+                    continue
+                record = json.loads(row)
+                if not isinstance(record, dict):
+                    raise ValueError("not a JSON object")
+            else:
+                record = dict(zip(header, row))
+            # JSON numbers arrive as floats, their shortest repr is what was written
+            measures = [(key, repr(value) if type(value) is float else value)
+                        for (key, value) in record.items()
+                        if key in pollutants and value not in (None, '')]
+            record.update(convert_measures(_aqi, conv, measures, verbose))
+        except (ArithmeticError, ValueError, TypeError, AttributeError, IndexError):
+            errors += 1
+            if not isinstance(record, dict):
+                record = {}
+            record[ERROR_COLUMN] = True
+        out.append(record)
+    return (out, errors)
+
+
+def output_columns(header, pollutants, conv, verbose):
+    """CSV output columns: the input columns followed by the results."""
+    measured = [column for column in header if column in pollutants]
+    if conv == 'cc':
+        added = [elem + '_cc' for elem in measured]
+    else:
+        added = [AQI_COLUMN] + ([elem + '_iaqi' for elem in measured] if verbose else [])
+    return header + [column for column in added if column not in header] + [ERROR_COLUMN]
+
+
+class Writer(object):
+    """Incremental CSV or NDJSON output."""
+
+    def __init__(self, stream, fmt, columns=None):
+        self.stream = stream
+        self.fmt = fmt
+        self.csv = None
+        if fmt == FORMAT_CSV:
+            self.csv = csv.DictWriter(stream, fieldnames=columns, extrasaction='ignore', lineterminator='\n')
+            self.csv.writeheader()
+
+    @staticmethod
+    def text(value):
+        return '' if value is None else str(value)
+
+    def write(self, records):
+        if self.fmt == FORMAT_NDJSON:
+            for record in records:
+                self.stream.write(json.dumps(record, default=str) + '\n')
+            return
+        for record in records:
+            self.csv.writerow(dict((key, self.text(value)) for (key, value) in record.items()))
+
+
+def run_batch(algo, path, conv='aqi', fmt=None, output=None, jobs=1,
+              chunk_size=DEFAULT_CHUNK_SIZE, verbose=False, report=sys.stderr):
+    """Convert every row of a CSV or NDJSON input and write the results
+    incrementally. Return (rows, errors).
+
+    :param algo: algorithm module canonical name
+    :type algo: str
+    :param path: input file name, or '-' for stdin
+    :type path: str
+    :param conv: 'aqi' to compute the AQI of each row, 'cc' to convert IAQIs back to concentrations
+    :type conv: str
+    :param fmt: 'csv' or 'ndjson', guessed from the file name if None
+    :type fmt: str
+    :param output: output file name, stdout if None
+    :type output: str
+    :param jobs: number of worker processes, 1 converts in this process
+    :type jobs: int
+    :param chunk_size: rows per chunk
+    :type chunk_size: int
+    :param verbose: add the IAQI of each pollutant
+    :type verbose: bool
+    :param report: stream for the throughput report, None for no report
+    """
+    fmt = fmt or detect_format(path)
+    lines = read_lines(path)
+    header = None
+    if fmt == FORMAT_CSV:
+        rows = csv.reader(lines)
+        header = next(rows, None)
+        if header is None:
+            return (0, 0)
+    else:
+        rows = lines
+
+    columns = None
+    if fmt == FORMAT_CSV:
+        pollutants = set(elem for (elem, unit) in get_algo(algo).list_pollutants())
+        columns = output_columns(header, pollutants, conv, verbose)
+    stream = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    writer = Writer(stream, fmt, columns)
+    started = time.perf_counter()
+    total = 0
+    errors = 0
+    try:
+        if jobs <= 1:
+            results = (convert_chunk(algo, conv, fmt, header, verbose, chunk)
+                       for chunk in chunked(rows, chunk_size))
+            for (records, failed) in results:
+                writer.write(records)
+                total += len(records)
+                errors += failed
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                pending = deque()
+                for chunk in chunked(rows, chunk_size):
+                    pending.append(pool.submit(convert_chunk, algo, conv, fmt, header, verbose, chunk))
+                    # keep a bounded number of chunks in flight, written in input order
+                    while len(pending) >= jobs * IN_FLIGHT_PER_JOB:
+                        (records, failed) = pending.popleft().result()
+                        writer.write(records)
+                        total += len(records)
+                        errors += failed
+                while pending:
+                    (records, failed) = pending.popleft().result()
+                    writer.write(records)
+                    total += len(records)
+                    errors += failed
+    finally:
+        stream.flush()
+        if output:
+            stream.close()
+
+    elapsed = time.perf_counter() - started
+    if report is not None:
+        rate = total / elapsed if elapsed > 0 else 0.0
+        report.write("{rows} rows, {errors} errors in {elapsed:.2f}s ({rate:.0f} rows/s)\n".format(
+            rows=total, errors=errors, elapsed=elapsed, rate=rate))
+    return (total, errors)
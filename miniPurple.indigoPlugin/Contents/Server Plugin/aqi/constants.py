@@ -16,3 +16,5 @@ POLLUTANT_NO2_24H = 'no2_24h'
 # constants for algorithms, canonical module name
 ALGO_EPA = 'aqi.algos.epa'
 ALGO_MEP = 'aqi.algos.mep'
+ALGO_EPA_NOWCAST = 'aqi.algos.epa_nowcast'
+ALGO_EPA_PURPLEAIR = 'aqi.algos.epa_purpleair'
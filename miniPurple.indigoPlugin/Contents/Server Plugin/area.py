@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Area devices: every outdoor sensor inside a lat/lon + radius circle, fetched with a single
+# bounding box query, indexed in a uniform lat/lon grid and aggregated into one reading.
+
+import math
+from statistics import median
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+MIN_IDW_DISTANCE_KM = 0.1       # keeps a sensor sitting on the center from taking all the weight
+
+AREA_FIELDS = ('latitude', 'longitude', 'pm2.5', 'last_seen')
+AREA_MAX_AGE = 3600             # only sensors that reported in the last hour
+
+AGGREGATE_MEDIAN = 'median'
+AGGREGATE_IDW = 'idw'
+
+
+def bounding_box(lat, lon, radius_km):
+    """Return (nwlat, nwlng, selat, selng) of the box around the circle."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return min(lat + dlat, 90.0), max(lon - dlon, -180.0), max(lat - dlat, -90.0), min(lon + dlon, 180.0)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great circle distance in km."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class SpatialGrid(object):
+    """Uniform grid over lat/lon, cells of cell_deg degrees, each holding (lat, lon, item) entries."""
+
+    def __init__(self, cell_deg=0.05):
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def insert(self, lat, lon, item):
+        self.cells.setdefault(self.cell(lat, lon), []).append((lat, lon, item))
+        self.count += 1
+
+    def within(self, lat, lon, radius_km):
+        """Return [(distance_km, item)] for every entry inside the circle, nearest first."""
+        nwlat, nwlng, selat, selng = bounding_box(lat, lon, radius_km)
+        (row_lo, col_lo) = self.cell(selat, nwlng)
+        (row_hi, col_hi) = self.cell(nwlat, selng)
+        found = []
+        for row in range(row_lo, row_hi + 1):
+            for col in range(col_lo, col_hi + 1):
+                for (elat, elon, item) in self.cells.get((row, col), ()):
+                    distance = haversine(lat, lon, elat, elon)
+                    if distance <= radius_km:
+                        found.append((distance, item))
+        found.sort(key=lambda entry: entry[0])
+        return found
+
+
+def aggregate(neighbours, method=AGGREGATE_MEDIAN):
+    """Combine [(distance_km, value)] into one value, None if empty."""
+    if not neighbours:
+        return None
+    if method == AGGREGATE_IDW:
+        num = 0.0
+        den = 0.0
+        for (distance, value) in neighbours:
+            weight = 1.0 / max(distance, MIN_IDW_DISTANCE_KM) ** 2
+            num += weight * value
+            den += weight
+        return num / den
+    return median(value for (distance, value) in neighbours)
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# asyncio polling engine.  Each sensor has its own deadline in the plugin's PollScheduler, due sensors are grouped into
+# batched requests and many requests can be in flight at once.  The blocking requests.Session
+# calls run on the Poller's worker pool through run_in_executor, which stands in for an async
+# HTTP client (none is bundled with Indigo).
+
+import asyncio
+
+import requests
+
+from poller import MAX_SENSORS_PER_REQUEST
+from area import AREA_FIELDS, AREA_MAX_AGE
+STOP_CHECK_INTERVAL = 0.5   # longest time between checks of the plugin's stopThread flag
+
+
+class AsyncPollLoop(object):
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.logger = plugin.logger
+        self.tasks = set()
+
+    def run(self):
+        """Run the event loop until the plugin is stopping or another engine is selected."""
+        asyncio.run(self.main())
+
+    def should_run(self):
+        return not self.plugin.stopThread and self.plugin.pollingEngine == 'asyncio'
+
+    async def main(self):
+        self.logger.debug("asyncio polling engine started")
+        scheduler = self.plugin.scheduler
+        try:
+            while self.should_run():
+                due = scheduler.pop_due()
+                if due:
+                    profiling = self.plugin.profiler.start()
+                    started = self.dispatch(due)
+                    if profiling:
+                        self.start(self.finish_profile(started))
+                self.plugin.checkStale()
+                self.plugin.checkBudget()
+                self.plugin.keyCheck.start(self.plugin.apiReadKey)
+                await asyncio.sleep(scheduler.delay(limit=STOP_CHECK_INTERVAL))
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            self.logger.debug("asyncio polling engine stopped")
+
+    def dispatch(self, due):
+        """Start a fetch task for each due key and return the tasks started."""
+        scheduler = self.plugin.scheduler
+        started = [self.start(self.fetch_local(key)) for key in due if key in self.plugin.localDevices]
+        cloud = [key for key in due if key not in self.plugin.localDevices]
+        blocked = self.plugin.budget.blocked()
+        if cloud and blocked:
+            for key in cloud:
+                scheduler.retry(key, delay=blocked)
+        elif cloud and not self.plugin.api_key_ok:
+            delay = self.plugin.keyWait()
+            for key in cloud:
+                scheduler.retry(key, delay=delay)
+        elif cloud:
+            areas = [key for key in cloud if key in self.plugin.areaDevices]
+            sensors = [key for key in cloud if key not in self.plugin.areaDevices]
+            for start in range(0, len(sensors), MAX_SENSORS_PER_REQUEST):
+                started.append(self.start(self.fetch(sensors[start:start + MAX_SENSORS_PER_REQUEST])))
+            for key in areas:
+                started.append(self.start(self.fetch_area(key)))
+        return started
+
+    def start(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def finish_profile(self, started):
+        """Stop the cycle profile once every request it started has been processed.  Work done on the
+        worker threads shows up as time spent waiting on run_in_executor."""
+        await asyncio.gather(*started, return_exceptions=True)
+        self.plugin.logProfile()
+
+    async def fetch_local(self, key):
+        if key not in self.plugin.localDevices:
+            return
+        try:
+            poller = self.plugin.poller
+            host = self.plugin.localHost(key)
+            loop = asyncio.get_running_loop()
+            with self.plugin.metrics.timer('getLocalData'):
+                try:
+                    response = await loop.run_in_executor(poller.executor, poller.get_local, host)
+                except requests.exceptions.RequestException as err:
+                    self.logger.error(f"getLocalData RequestException: {err}")
+                    self.plugin.scheduler.retry(key)
+                else:
+                    self.plugin.processLocalReply(key, response)
+        except Exception as err:
+            # tasks are never awaited, so anything else has to be logged and rescheduled here
+            self.plugin.recoverKeys([key], "getLocalData", err)
+
+    async def fetch_area(self, key):
+        if key not in self.plugin.areaDevices:
+            return
+        try:
+            poller = self.plugin.poller
+            loop = asyncio.get_running_loop()
+            self.plugin.planArea(key)
+            with self.plugin.metrics.timer('getAreaData'):
+                try:
+                    response = await loop.run_in_executor(poller.executor, poller.get_area, self.plugin.areaBox(key), AREA_FIELDS,
+                                                          self.plugin.apiReadKey, AREA_MAX_AGE)
+                except requests.exceptions.RequestException as err:
+                    self.logger.error(f"getAreaData RequestException: {err}")
+                    self.plugin.scheduler.retry(key)
+                else:
+                    self.plugin.processAreaReply(key, response)
+            self.plugin.budgetCycle()
+        except Exception as err:
+            self.plugin.recoverKeys([key], "getAreaData", err)
+
+    async def fetch(self, chunk):
+        try:
+            poller = self.plugin.poller
+            loop = asyncio.get_running_loop()
+            self.plugin.budget.plan(len(chunk), self.plugin.apiFields)
+            with self.plugin.metrics.timer('getData'):
+                try:
+                    response = await loop.run_in_executor(poller.executor, poller.get_sensors, chunk, self.plugin.apiFields,
+                                                          self.plugin.apiReadKey, self.plugin.cache.modified_since(chunk))
+                except requests.exceptions.RequestException as err:
+                    self.logger.error(f"getData RequestException: {err}")
+                    for sensorID in chunk:
+                        self.plugin.scheduler.retry(sensorID)
+                else:
+                    self.plugin.processSensorReply(chunk, response)
+            self.plugin.budgetCycle()
+        except Exception as err:
+            self.plugin.recoverKeys(chunk, "getData", err)
@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# PurpleAir API points accounting.  Estimates the cost of each request from its field and
+# row counts, tracks usage per local day, projects the day's total from the recent rate and
+# works out how much poll intervals must be stretched to stay inside the daily budget.
+# Recent usage is kept scaled back to an unstretched rate, so the stretch is simply that rate
+# over the rate the rest of the day's budget allows.  Also tracks rate-limit (429) backoff.
+
+import threading
+import time
+from collections import deque
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+FIELD_POINTS = 1            # estimated points per field per returned row
+RECENT_WINDOW = 3600        # seconds of usage used to estimate the current rate, at least
+MIN_RATE_WINDOW = 300       # don't extrapolate from less than this
+MAX_STRETCH = 48.0
+MIN_BACKOFF = 60.0
+MAX_BACKOFF = 3600.0
+
+
+def estimate_points(rows, fields):
+    return rows * len(fields) * FIELD_POINTS
+
+
+def parse_retry_after(retry_after, now):
+    """Seconds to wait from a Retry-After header, either delay-seconds or an HTTP-date.
+    None if the header can't be parsed."""
+    try:
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(retry_after)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)     # "-0000" dates are UTC too
+        return max(when.timestamp() - now, 0.0)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class PointsBudget(object):
+
+    def __init__(self, daily_budget=0):
+        self.lock = threading.Lock()
+        self.daily_budget = daily_budget   # 0 means unlimited
+        self.day = None
+        self.used_today = 0
+        self.planned_today = 0
+        self.recent = deque()               # (time, points times the stretch they were polled at)
+        self.stretch = 1.0
+        self.remeasure = False              # usage recorded since the stretch was last worked out
+        self.backoff = 0.0
+        self.blocked_until = 0.0
+
+    @staticmethod
+    def seconds_left_today(now):
+        t = time.localtime(now)
+        return max(86400 - (t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec), 1)
+
+    def roll_day(self, now):
+        day = time.localtime(now)[:3]
+        if day != self.day:
+            if self.day is not None:
+                # a fresh budget, start unstretched and work it out again from the recent rate
+                self.stretch = 1.0
+                self.remeasure = True
+            self.day = day
+            self.used_today = 0
+            self.planned_today = 0
+
+    def configure(self, daily_budget):
+        with self.lock:
+            if daily_budget != self.daily_budget:
+                self.daily_budget = daily_budget
+                self.remeasure = True
+
+    ########################################
+
+    def plan(self, rows, fields, now=None):
+        """Account for the estimated cost of a request about to be made."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.roll_day(now)
+            points = estimate_points(rows, fields)
+            self.planned_today += points
+            return points
+
+    def record(self, rows, fields, now=None):
+        """Account for the actual cost of a reply."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.roll_day(now)
+            points = estimate_points(rows, fields)
+            self.used_today += points
+            self.recent.append((now, points * self.stretch))
+            self.remeasure = True
+            self.backoff = 0.0
+            return points
+
+    def base_rate(self, now):
+        """Points per second polling costs without any stretch, or None until there is enough
+        history.  Measured from the last request at or before the start of the window, so the span
+        always covers at least one whole gap between requests, however long the intervals get."""
+        start = now - RECENT_WINDOW
+        while len(self.recent) > 1 and self.recent[1][0] <= start:
+            self.recent.popleft()
+        if not self.recent:
+            return None
+        anchor = self.recent[0][0]
+        span = now - anchor
+        if span < MIN_RATE_WINDOW:
+            return None
+        return sum(points for (t, points) in self.recent if t > anchor) / span
+
+    def rate(self, now):
+        """Points per second at the current stretch."""
+        base = self.base_rate(now)
+        return base / self.stretch if base else 0.0
+
+    def projected(self, now=None):
+        """Projected points for the whole day at the current rate."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.roll_day(now)
+            return int(self.used_today + self.rate(now) * self.seconds_left_today(now))
+
+    def update_stretch(self, now=None):
+        """Recompute the factor poll intervals are multiplied by, and return it.  Only new usage,
+        a new day or a new budget change it, so it can be called between polls."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.roll_day(now)
+            if self.daily_budget <= 0:
+                self.stretch = 1.0
+                return self.stretch
+            seconds_left = self.seconds_left_today(now)
+            allowed = (self.daily_budget - self.used_today) / seconds_left
+            if allowed <= 0:
+                # budget spent, nothing more until tomorrow
+                self.blocked_until = max(self.blocked_until, now + seconds_left)
+                self.stretch = MAX_STRETCH
+            elif self.remeasure:
+                base = self.base_rate(now)
+                if base is not None:
+                    self.stretch = min(max(base / allowed, 1.0), MAX_STRETCH)
+                    self.remeasure = False
+            return self.stretch
+
+    ########################################
+
+    def rate_limited(self, retry_after=None, now=None):
+        """The API answered 429, back off for Retry-After or an exponentially growing delay."""
+        now = time.time() if now is None else now
+        with self.lock:
+            delay = parse_retry_after(retry_after, now) if retry_after else None
+            if delay is None:
+                self.backoff = min(max(self.backoff * 2, MIN_BACKOFF), MAX_BACKOFF)
+                delay = self.backoff
+            self.blocked_until = max(self.blocked_until, now + delay)
+            return delay
+
+    def blocked(self, now=None):
+        """Seconds until requests may be made again, 0 if not blocked."""
+        now = time.time() if now is None else now
+        return max(self.blocked_until - now, 0.0)
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        projected = self.projected(now)
+        with self.lock:
+            return {
+                'budget': self.daily_budget,
+                'used': self.used_today,
+                'planned': self.planned_today,
+                'projected': projected,
+                'stretch': self.stretch,
+                'blocked': max(self.blocked_until - now, 0.0),
+            }
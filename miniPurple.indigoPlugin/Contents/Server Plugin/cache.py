@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Response cache keyed by sensor ID.  Remembers the API time_stamp of the last reply that
+# carried each sensor and the sensor's last_seen, so group requests can send modified_since
+# and rows that haven't changed since the last poll can be skipped.
+
+import threading
+
+
+class ResponseCache(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}   # sensor ID -> (time_stamp, last_seen)
+        self.hits = 0       # sensor skipped, either left out by modified_since or last_seen unchanged
+        self.misses = 0     # sensor had new data and was written to its device
+
+    def forget(self, sensorID):
+        with self.lock:
+            self.entries.pop(sensorID, None)
+
+    def modified_since(self, chunk):
+        """Oldest reply time_stamp for the chunk, or None if any sensor in it has never been fetched."""
+        with self.lock:
+            stamps = []
+            for sensorID in chunk:
+                entry = self.entries.get(sensorID)
+                if entry is None:
+                    return None
+                stamps.append(entry[0])
+        return min(stamps) if stamps else None
+
+    def last_seen(self, sensorID):
+        entry = self.entries.get(sensorID)
+        return entry[1] if entry else None
+
+    def check(self, sensorID, time_stamp, last_seen):
+        """Record a row from a reply, return True if it carries new data."""
+        with self.lock:
+            entry = self.entries.get(sensorID)
+            self.entries[sensorID] = (time_stamp, last_seen)
+            if entry is not None and last_seen is not None and entry[1] == last_seen:
+                self.hits += 1
+                return False
+            self.misses += 1
+            return True
+
+    def unchanged(self, sensorID, time_stamp=None):
+        """Count a sensor that modified_since left out of the reply.  Its data is current as of the
+        reply's time_stamp, so that becomes its stamp, or one quiet sensor would hold modified_since
+        back for its whole chunk."""
+        with self.lock:
+            self.hits += 1
+            entry = self.entries.get(sensorID)
+            if entry is not None and time_stamp is not None:
+                self.entries[sensorID] = (time_stamp, entry[1])
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            ratio = (100.0 * self.hits / total) if total else 0.0
+            return {'hits': self.hits, 'misses': self.misses, 'hitRatio': ratio, 'sensors': len(self.entries)}
@@ -0,0 +1,41 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Dual laser (A/B channel) validation.  Outdoor PurpleAir units report pm2.5 from two
+# independent lasers; when one fails the combined value is wrong.  Channels are treated
+# as diverged when they differ by more than both the absolute and the relative threshold.
+
+DEFAULT_ABS_THRESHOLD = 5.0     # µg/m³
+DEFAULT_REL_THRESHOLD = 0.7     # fraction of the channel mean
+
+CONFIDENCE_DIVERGED = 25
+CONFIDENCE_SINGLE = 50
+
+
+def merge_channels(a, b, abs_threshold=DEFAULT_ABS_THRESHOLD, rel_threshold=DEFAULT_REL_THRESHOLD, previous=None):
+    """Merge channel A and B readings into one value.
+    Returns (value, confidence 0-100, status).  When the channels diverge the one closest
+    to the previous merged value is used, or the lower one if there is no previous value.
+    """
+    if a is None and b is None:
+        return None, 0, "No Data"
+    if b is None:
+        return a, CONFIDENCE_SINGLE, "A Only"
+    if a is None:
+        return b, CONFIDENCE_SINGLE, "B Only"
+
+    diff = abs(a - b)
+    mean = (a + b) / 2.0
+    rel_limit = rel_threshold * mean
+    if diff > abs_threshold and diff > rel_limit:
+        if previous is not None:
+            use_a = abs(a - previous) <= abs(b - previous)
+        else:
+            use_a = a <= b
+        return (a, CONFIDENCE_DIVERGED, "A (B Diverged)") if use_a else (b, CONFIDENCE_DIVERGED, "B (A Diverged)")
+
+    # agreeing channels, confidence drops towards 50 as they approach the nearest threshold
+    ratio = diff / abs_threshold if abs_threshold > 0 else 0.0
+    if rel_limit > 0:
+        ratio = min(ratio, diff / rel_limit)
+    return mean, int(round(100 - 50 * min(ratio, 1.0))), "A+B"
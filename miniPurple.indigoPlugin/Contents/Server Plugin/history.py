@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# In-memory time-series history of sensor readings.  Each series is an append-only ring
+# buffer of (time, value) records in two array('d') columns, with running sums per averaging
+# window so 1h/8h/24h means are O(1) per new reading.  A full ring whose oldest record is still
+# inside the longest window doubles in size, so fast polled (LAN) sensors keep a full 24 hours.
+
+import threading
+from array import array
+
+WINDOW_1H = 3600
+WINDOW_8H = 8 * 3600
+WINDOW_24H = 24 * 3600
+WINDOWS = (WINDOW_1H, WINDOW_8H, WINDOW_24H)
+
+# 24 hours of 2 minute readings, with some headroom
+DEFAULT_CAPACITY = 1024
+# 24 hours of 5 second (fastest LAN) readings, with some headroom
+MAX_CAPACITY = 32768
+
+# fields kept for each sensor
+HISTORY_FIELDS = ('pm1.0', 'pm2.5', 'pm10.0')
+
+
+class RollingSeries(object):
+
+    def __init__(self, windows=WINDOWS, capacity=DEFAULT_CAPACITY, max_capacity=MAX_CAPACITY):
+        self.capacity = capacity
+        self.max_capacity = max(max_capacity, capacity)
+        self.span = max(windows)    # longest window, records inside it are never overwritten below max_capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.count = 0              # records ever appended, the next record's absolute index
+        self.windows = {window: [0, 0.0] for window in windows}   # window -> [oldest absolute index, sum]
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def last_time(self):
+        return self.times[(self.count - 1) % self.capacity] if self.count else None
+
+    def evict(self, state, index):
+        state[1] -= self.values[index % self.capacity]
+        state[0] = index + 1
+        if state[0] == self.count:
+            state[1] = 0.0     # window is empty, drop any accumulated rounding error
+
+    def grow(self):
+        """Double the ring, keeping every record at the slot of its absolute index."""
+        capacity = min(self.capacity * 2, self.max_capacity)
+        times = array('d', bytes(8 * capacity))
+        values = array('d', bytes(8 * capacity))
+        for index in range(max(self.count - self.capacity, 0), self.count):
+            times[index % capacity] = self.times[index % self.capacity]
+            values[index % capacity] = self.values[index % self.capacity]
+        self.capacity, self.times, self.values = capacity, times, values
+
+    def append(self, timestamp, value):
+        oldest = self.count - self.capacity
+        if oldest >= 0 and self.capacity < self.max_capacity and self.times[oldest % self.capacity] > timestamp - self.span:
+            self.grow()
+            oldest = self.count - self.capacity
+        if oldest >= 0:
+            # the ring is full, the record about to be overwritten leaves every window still holding it
+            for state in self.windows.values():
+                if state[0] == oldest:
+                    self.evict(state, oldest)
+
+        slot = self.count % self.capacity
+        self.times[slot] = timestamp
+        self.values[slot] = value
+        self.count += 1
+
+        for window, state in self.windows.items():
+            state[1] += value
+            while state[0] < self.count - 1 and self.times[state[0] % self.capacity] <= timestamp - window:
+                self.evict(state, state[0])
+
+    def mean(self, window):
+        start, total = self.windows[window]
+        n = self.count - start
+        return total / n if n else None
+
+
+class HistoryStore(object):
+
+    def __init__(self, fields=HISTORY_FIELDS, windows=WINDOWS, capacity=DEFAULT_CAPACITY):
+        self.lock = threading.Lock()
+        self.fields = fields
+        self.windows = windows
+        self.capacity = capacity
+        self.sensors = {}   # sensor ID -> {field: RollingSeries}
+
+    def forget(self, sensorID):
+        with self.lock:
+            self.sensors.pop(sensorID, None)
+
+    def record(self, sensorID, timestamp, sensor_data):
+        """Append a reading.  Readings that aren't newer than the last one are ignored."""
+        with self.lock:
+            series = self.sensors.get(sensorID)
+            if series is None:
+                series = self.sensors[sensorID] = {field: RollingSeries(self.windows, self.capacity) for field in self.fields}
+            for field, s in series.items():
+                value = sensor_data.get(field)
+                if value is None:
+                    continue
+                last = s.last_time()
+                if last is not None and timestamp <= last:
+                    continue
+                s.append(float(timestamp), float(value))
+
+    def mean(self, sensorID, field, window):
+        with self.lock:
+            series = self.sensors.get(sensorID)
+            if series is None or field not in series:
+                return None
+            return series[field].mean(window)
@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# API key validation off the startup path.  Checks run on a background thread and their result
+# is cached per key with a TTL, so the config dialog and the poll loops reuse it instead of
+# calling /v1/keys again.  A check that couldn't reach the API (result None) is retried sooner.
+
+import threading
+import time
+
+KEY_TTL = 3600.0        # seconds a definite answer is trusted
+RETRY_TTL = 60.0        # seconds before retrying a check that couldn't reach the API
+
+
+class KeyCheck(object):
+
+    def __init__(self, check, on_result=None):
+        self.check = check              # blocking check(key) -> True, False, or None if it couldn't tell
+        self.on_result = on_result      # on_result(key, result), called after every check
+        self.lock = threading.Lock()
+        self.results = {}               # key -> (result, expires)
+        self.running = {}               # key -> threading.Event set when the check completes
+
+    def cached(self, key):
+        """Last result for key, even if expired, None if never checked."""
+        with self.lock:
+            return self.results.get(key, (None, 0.0))[0]
+
+    def fresh(self, key, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            return key in self.results and self.results[key][1] > now
+
+    def pending(self, key):
+        """True while the first check of key hasn't completed."""
+        with self.lock:
+            return key not in self.results
+
+    def start(self, key):
+        """Check key on a background thread unless it has a fresh result or a check is running."""
+        with self.lock:
+            if key in self.running or (key in self.results and self.results[key][1] > time.time()):
+                return
+            self.running[key] = threading.Event()
+        threading.Thread(target=self.run, args=(key,), name="miniPurple-keycheck", daemon=True).start()
+
+    def result(self, key, timeout=None):
+        """Return a fresh result for key, waiting for a running check or checking now."""
+        if self.fresh(key):
+            return self.cached(key)
+        with self.lock:
+            done = self.running.get(key)
+            if done is None:
+                self.running[key] = threading.Event()
+        if done is not None:
+            done.wait(timeout)
+            return self.cached(key)
+        return self.run(key)
+
+    def run(self, key):
+        try:
+            result = self.check(key)
+        except Exception:
+            result = None
+        with self.lock:
+            self.results[key] = (result, time.time() + (KEY_TTL if result is not None else RETRY_TTL))
+            self.running.pop(key).set()
+        if self.on_result:
+            self.on_result(key, result)
+        return result
+
@@ -0,0 +1,56 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# LAN polling of a sensor's own http://<ip>/json endpoint.  The local field names are mapped
+# onto the cloud API names, so the rest of the pipeline (channels, AQI, history, states)
+# doesn't care where a reading came from.
+
+import calendar
+import time
+
+DEFAULT_LOCAL_FREQUENCY = 30     # seconds, the sensor averages over 2 minutes but updates more often
+
+# cloud API field <- local /json key, copied as is
+LOCAL_FIELD_MAP = {
+    'latitude':         'lat',
+    'longitude':        'lon',
+    'rssi':             'rssi',
+    'uptime':           'uptime',
+    'firmware_version': 'version',
+    'hardware':         'hardwarediscovered',
+    'temperature':      'current_temp_f',
+    'humidity':         'current_humidity',
+    'pressure':         'pressure',
+    'pm2.5_a':          'pm2_5_atm',
+    'pm2.5_b':          'pm2_5_atm_b',
+}
+
+# cloud API field <- (channel A key, channel B key), averaged over the channels present
+LOCAL_CHANNEL_MAP = {
+    'pm1.0':        ('pm1_0_atm', 'pm1_0_atm_b'),
+    'pm2.5':        ('pm2_5_atm', 'pm2_5_atm_b'),
+    'pm10.0':       ('pm10_0_atm', 'pm10_0_atm_b'),
+    'pm2.5_cf_1':   ('pm2_5_cf_1', 'pm2_5_cf_1_b'),
+}
+
+
+def parse_datetime(value):
+    """Local DateTime is UTC, formatted like 2023/06/01T12:34:56z"""
+    try:
+        return calendar.timegm(time.strptime(value.rstrip('zZ'), "%Y/%m/%dT%H:%M:%S"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def map_local(reply):
+    """Convert a local /json reply into a dict keyed by cloud API field names."""
+    sensor_data = {}
+    for field, key in LOCAL_FIELD_MAP.items():
+        if key in reply:
+            sensor_data[field] = reply[key]
+    for field, keys in LOCAL_CHANNEL_MAP.items():
+        values = [reply[key] for key in keys if reply.get(key) is not None]
+        if values:
+            sensor_data[field] = sum(values) / len(values)
+    sensor_data['last_seen'] = parse_datetime(reply.get('DateTime')) or int(time.time())
+    return sensor_data
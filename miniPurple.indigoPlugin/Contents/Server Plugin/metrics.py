@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Lightweight performance instrumentation.  Timers use the monotonic perf_counter clock and
+# keep a rolling window of recent samples per name, from which p50/p95/p99 and the error rate
+# are worked out on demand.  Plain counters track events that have no duration.  CycleProfiler
+# wraps one poll cycle in cProfile when asked to from the plugin menu.
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+
+SAMPLE_WINDOW = 500         # recent samples kept per timer
+PROFILE_LINES = 25
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Timer(object):
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.name, time.perf_counter() - self.started, error=exc_type is not None)
+        return False
+
+
+class Metrics(object):
+
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.lock = threading.Lock()
+        self.window = window
+        self.samples = {}       # name -> deque of durations in seconds
+        self.outcomes = {}      # name -> deque of 0 (ok) / 1 (error)
+        self.totals = {}        # name -> [calls, errors] since startup
+        self.counters = {}      # name -> count since startup
+
+    def timer(self, name):
+        """Context manager that times the block and counts it as an error if it raises."""
+        return Timer(self, name)
+
+    def record(self, name, seconds, error=False):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+                self.outcomes[name] = deque(maxlen=self.window)
+                self.totals[name] = [0, 0]
+            samples.append(seconds)
+            self.outcomes[name].append(1 if error else 0)
+            totals = self.totals[name]
+            totals[0] += 1
+            if error:
+                totals[1] += 1
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.outcomes.clear()
+            self.totals.clear()
+            self.counters.clear()
+
+    ########################################
+
+    def timer_stats(self, name):
+        """Rolling stats of one timer, durations in milliseconds, or None if it never ran."""
+        with self.lock:
+            if name not in self.samples:
+                return None
+            ordered = sorted(self.samples[name])
+            outcomes = list(self.outcomes[name])
+            calls, errors = self.totals[name]
+        return {
+            'calls':     calls,
+            'errors':    errors,
+            'errorRate': 100.0 * sum(outcomes) / len(outcomes),
+            'mean':      1000.0 * sum(ordered) / len(ordered),
+            'p50':       1000.0 * percentile(ordered, 50),
+            'p95':       1000.0 * percentile(ordered, 95),
+            'p99':       1000.0 * percentile(ordered, 99),
+            'max':       1000.0 * ordered[-1],
+        }
+
+    def stats(self):
+        with self.lock:
+            names = sorted(self.samples)
+            counters = dict(self.counters)
+        return {
+            'timers':   {name: self.timer_stats(name) for name in names},
+            'counters': counters,
+        }
+
+
+class CycleProfiler(object):
+    """Profiles the next poll cycle once requested, then goes back to sleep."""
+
+    def __init__(self):
+        self.requested = False
+        self.profile = None
+
+    def request(self):
+        self.requested = True
+
+    def start(self):
+        if not self.requested or self.profile is not None:
+            return False
+        self.requested = False
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        return True
+
+    def finish(self, path=None):
+        """Stop profiling, optionally dump the raw stats to path, and return a text report."""
+        if self.profile is None:
+            return None
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+        if path:
+            profile.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINES)
+        return report.getvalue()
@@ -3,10 +3,35 @@
 ####################
 
 import time
-import requests
+IMPORT_STARTED = time.perf_counter()    # startup timing includes the imports below
+
+import os
+import threading
+import traceback
 import logging
-import json
 import aqi
+from aqi.algos.epa_nowcast import NowCast
+from aqi.algos.epa_purpleair import correct_pm25
+
+from sensor_fields import api_fields, build_state_list, DEADBANDS
+from scheduler import PollScheduler
+from cache import ResponseCache
+from shadow import StateShadow
+from channels import merge_channels, DEFAULT_ABS_THRESHOLD, DEFAULT_REL_THRESHOLD, CONFIDENCE_DIVERGED
+from local import map_local, DEFAULT_LOCAL_FREQUENCY
+from budget import PointsBudget
+from area import SpatialGrid, bounding_box, aggregate, AREA_FIELDS, AREA_MAX_AGE, AGGREGATE_MEDIAN
+from history import HistoryStore, WINDOW_1H, WINDOW_8H, WINDOW_24H
+from metrics import Metrics, CycleProfiler
+from readings import SensorReading, loads
+from keycheck import KeyCheck
+from triggers import make_watch
+
+THREADDEBUG = 5         # Indigo's "Detailed Debugging Messages" level
+MAX_IDLE_SLEEP = 10.0   # longest sleep between scheduler checks, so new devices are picked up promptly
+STALE_CHECK_INTERVAL = 60.0
+OFFLINE_FACTOR = 4      # data older than this many stale thresholds means the sensor is offline
+KEY_WAIT = 5.0          # retry delay for polls due before the API key has been checked
 
 ################################################################################
 class Plugin(indigo.PluginBase):
@@ -15,6 +40,7 @@ class Plugin(indigo.PluginBase):
     # Main Plugin methods
     ########################################
     def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
+        self.initStarted = time.perf_counter()
         indigo.PluginBase.__init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs)
 
         pfmt = logging.Formatter('%(asctime)s.%(msecs)03d\t[%(levelname)8s] %(name)20s.%(funcName)-25s%(msg)s', datefmt='%Y-%m-%d %H:%M:%S')
@@ -24,25 +50,94 @@ class Plugin(indigo.PluginBase):
         self.logger.debug(f"logLevel = {self.logLevel}")
 
         self.sensorDevices = {}  # Indigo device IDs, keyed by address (sensor ID)
+        self.areaDevices = {}    # Indigo device IDs, keyed by scheduler key ("area-<device ID>")
+        self.localDevices = {}   # Indigo device IDs of LAN polled sensors, keyed by scheduler key ("local-<device ID>")
+        self.diagnosticDevices = set()
+        self.areaIndex = {}      # SpatialGrid of the last reply, keyed by Indigo device ID
+        self.apiFields = api_fields()
+        self.cache = ResponseCache()
+        self.shadow = StateShadow(DEADBANDS)
+        self.history = HistoryStore()
+        self.nowcasts = {}  # streaming NowCast of pm2.5, keyed by sensor ID
+        self.metrics = Metrics()
+        self.profiler = CycleProfiler()
+        self.triggerWatches = {}    # {device ID: {trigger ID: (trigger, Watch)}} of the plugin events
+        self.triggerLock = threading.Lock()
 
         self.updateFrequency = float(pluginPrefs.get('updateFrequency', "1")) * 60.0
         self.logger.debug(f"updateFrequency = {self.updateFrequency}")
-        self.next_update = time.time()
+        self.channelAbsThreshold, self.channelRelThreshold = self.channelThresholds(pluginPrefs)
+        self.staleThreshold = float(pluginPrefs.get('staleMinutes', "30")) * 60.0
+        self.next_stale_check = 0.0
+        self.scheduler = PollScheduler(self.updateFrequency, *self.frequencyBounds(pluginPrefs))
+        self.pollingEngine = pluginPrefs.get('pollingEngine', 'thread')
+        self.logger.debug(f"pollingEngine = {self.pollingEngine}")
+        self.budget = PointsBudget(int(pluginPrefs.get('dailyPointsBudget', "0")))
+        self.logger.debug(f"dailyPointsBudget = {self.budget.daily_budget}")
+
+        # requests is only imported, and the poller created, on the first request
+        self.maxWorkers, self.requestTimeout = self.pollerSettings(pluginPrefs)
+        self.pollerInstance = None
+        self.pollerLock = threading.Lock()
 
+        # the key is checked in the background once the plugin is running
         self.apiReadKey = pluginPrefs.get("apiReadKey", None)
-        self.api_key_ok = self.read_key_ok(self.apiReadKey)
+        self.api_key_ok = False
+        self.keyCheck = KeyCheck(self.read_key_ok, self.keyChecked)
+
+    def startup(self):
+        self.keyCheck.start(self.apiReadKey)
+        now = time.perf_counter()
+        self.logger.info(f"Started in {(now - IMPORT_STARTED) * 1000:.0f} ms ({(self.initStarted - IMPORT_STARTED) * 1000:.0f} ms loading modules)")
+
+    def traceEnabled(self):
+        """True if threaddebug messages reach a log, so reply bodies are only formatted when they'll be seen."""
+        return self.logger.isEnabledFor(THREADDEBUG) and \
+            min(self.indigo_log_handler.level, self.plugin_file_handler.level) <= THREADDEBUG
+
+    def shutdown(self):
+        self.closePoller()
+
+    @property
+    def poller(self):
+        with self.pollerLock:
+            if self.pollerInstance is None:
+                from poller import Poller
+                self.logger.debug(f"poller workers = {self.maxWorkers}, timeout = {self.requestTimeout}")
+                self.pollerInstance = Poller(self.logger, workers=self.maxWorkers, read_timeout=self.requestTimeout, metrics=self.metrics)
+            return self.pollerInstance
 
-    def read_key_ok(self, key) -> bool:
-        self.apiReadKey = key
-        if not (self.apiReadKey and len(self.apiReadKey)):
+    def closePoller(self):
+        with self.pollerLock:
+            if self.pollerInstance is not None:
+                self.pollerInstance.close()
+                self.pollerInstance = None
+
+    @staticmethod
+    def pollerSettings(prefs):
+        return int(prefs.get('maxWorkers', "4")), float(prefs.get('requestTimeout', "30"))
+
+    @staticmethod
+    def frequencyBounds(prefs):
+        return float(prefs.get('minUpdateFrequency', "5")) * 60.0, float(prefs.get('maxUpdateFrequency', "60")) * 60.0
+
+    @staticmethod
+    def channelThresholds(prefs):
+        return float(prefs.get('channelAbsThreshold', DEFAULT_ABS_THRESHOLD)), float(prefs.get('channelRelThreshold', DEFAULT_REL_THRESHOLD * 100)) / 100.0
+
+    def read_key_ok(self, key):
+        """Blocking check of an API key, True or False, or None if the API couldn't be reached."""
+        if not (key and len(key)):
             self.logger.error("API Read Key must be specified in Plugin Config")
             return False
 
+        import requests
+        from poller import API_BASE
         try:
-            response = requests.get(f"https://api.purpleair.com/v1/keys", headers={'X-API-Key': self.apiReadKey})
+            response = self.poller.get(f"{API_BASE}/keys", headers={'X-API-Key': key})
         except requests.exceptions.RequestException as err:
-            self.logger.error(f"{device.name}: check key RequestException: {err}")
-            return False
+            self.logger.error(f"check key RequestException: {err}")
+            return None
 
         try:
             if response.json()['api_key_type'] != "READ":
@@ -54,72 +149,597 @@ class Plugin(indigo.PluginBase):
 
         return True
 
+    def keyChecked(self, key, ok):
+        if key == self.apiReadKey and ok is not None:
+            if ok != self.api_key_ok:
+                self.logger.debug(f"API key valid = {ok}")
+            self.api_key_ok = ok
+
+    def keyWait(self):
+        """Retry delay for cloud polls that can't be made: short while the key is still being checked."""
+        return KEY_WAIT if self.keyCheck.pending(self.apiReadKey) else None
+
     def runConcurrentThread(self):
         try:
             while True:
-                if time.time() > self.next_update:
-                    if self.api_key_ok:
-                        self.getData()
-                    self.next_update = time.time() + self.updateFrequency
-                self.sleep(1.0)
+                if self.pollingEngine == 'asyncio':
+                    from async_poller import AsyncPollLoop
+                    AsyncPollLoop(self).run()   # returns when stopping or when the engine pref changes
+                    self.sleep(0.1)
+                    continue
+                due = self.scheduler.pop_due()
+                if due:
+                    profiling = self.profiler.start()
+                    with self.metrics.timer('cycle'):
+                        self.pollDue(due)
+                    if profiling:
+                        self.logProfile()
+                self.checkStale()
+                self.checkBudget()
+                self.keyCheck.start(self.apiReadKey)
+                self.sleep(self.scheduler.delay(limit=MAX_IDLE_SLEEP))
         except self.StopThread:
             pass
 
     def deviceStartComm(self, device):
             
-        if device.deviceTypeId == 'purpleSensor':
+        if device.deviceTypeId == 'purpleSensor' and device.pluginProps.get('useLocal', False):
+            self.logger.debug(f"{device.name}: deviceStartComm: Adding device ({device.id}) to LAN sensor list")
+            key = f"local-{device.id}"
+            self.localDevices[key] = device.id
+            self.scheduler.add(key, interval=float(device.pluginProps.get('localUpdateFrequency', DEFAULT_LOCAL_FREQUENCY)))
+
+        elif device.deviceTypeId == 'purpleSensor':
             self.logger.debug(f"{device.name}: deviceStartComm: Adding device ({device.id}) to sensor list")
             assert device.address not in self.sensorDevices
             self.sensorDevices[device.address] = device.id
+            self.scheduler.add(device.address)
             self.logger.threaddebug(f"devices = {self.sensorDevices}")
 
+        elif device.deviceTypeId == 'purpleDiagnostics':
+            self.diagnosticDevices.add(device.id)
+
+        elif device.deviceTypeId == 'purpleArea':
+            self.logger.debug(f"{device.name}: deviceStartComm: Adding device ({device.id}) to area list")
+            key = f"area-{device.id}"
+            self.areaDevices[key] = device.id
+            self.scheduler.add(key)
+
         device.stateListOrDisplayStateIdChanged()
 
     def deviceStopComm(self, device):
 
-        if device.deviceTypeId == 'purpleSensor':
+        if device.deviceTypeId == 'purpleSensor' and device.pluginProps.get('useLocal', False):
+            self.logger.debug(f"{device.name}: deviceStopComm: Removing device ({device.id}) from LAN sensor list")
+            key = f"local-{device.id}"
+            self.localDevices.pop(key, None)
+            self.scheduler.remove(key)
+            self.cache.forget(key)
+            self.shadow.forget(device.id)
+            self.history.forget(key)
+            self.nowcasts.pop(key, None)
+
+        elif device.deviceTypeId == 'purpleSensor':
             self.logger.debug(f"{device.name}: deviceStopComm: Removing device ({device.id}) from device list")
             assert device.address in self.sensorDevices
             del self.sensorDevices[device.address]
+            self.scheduler.remove(device.address)
+            self.cache.forget(device.address)
+            self.shadow.forget(device.id)
+            self.history.forget(device.address)
+            self.nowcasts.pop(device.address, None)
 
-    def getData(self):
+        elif device.deviceTypeId == 'purpleDiagnostics':
+            self.diagnosticDevices.discard(device.id)
+            self.shadow.forget(device.id)
 
-        for sensorID, devID in self.sensorDevices.items():
+        elif device.deviceTypeId == 'purpleArea':
+            self.logger.debug(f"{device.name}: deviceStopComm: Removing device ({device.id}) from area list")
+            key = f"area-{device.id}"
+            self.areaDevices.pop(key, None)
+            self.areaIndex.pop(device.id, None)
+            self.scheduler.remove(key)
+            self.shadow.forget(device.id)
 
-            device = indigo.devices[devID]
+    def triggerStartProcessing(self, trigger):
+        try:
+            watch = make_watch(trigger.pluginTypeId, trigger.pluginProps)
+            devID = int(trigger.pluginProps['deviceId'])
+        except (KeyError, ValueError) as err:
+            self.logger.error(f"{trigger.name}: invalid trigger settings: {err}")
+            return
+        self.logger.debug(f"{trigger.name}: triggerStartProcessing: watching {watch.state_key} of device {devID}")
+        with self.triggerLock:
+            self.triggerWatches.setdefault(devID, {})[trigger.id] = (trigger, watch)
+
+    def triggerStopProcessing(self, trigger):
+        self.logger.debug(f"{trigger.name}: triggerStopProcessing")
+        with self.triggerLock:
+            for devID, watches in list(self.triggerWatches.items()):
+                watches.pop(trigger.id, None)
+                if not watches:
+                    del self.triggerWatches[devID]
+
+    def validateEventConfigUi(self, valuesDict, typeId, eventId):
+        errorDict = indigo.Dict()
+        if not valuesDict.get('deviceId', ""):
+            errorDict['deviceId'] = "Select a device"
+        fields = [('hysteresis', "Hysteresis"), ('dwellMinutes', "Dwell time")]
+        if typeId == 'pmThreshold':
+            fields.append(('threshold', "Threshold"))
+        for key, label in fields:
             try:
-                response = requests.get(f"https://api.purpleair.com/v1/sensors/{sensorID}", headers={'X-API-Key': self.apiReadKey})
-            except requests.exceptions.RequestException as err:
-                self.logger.error(f"{device.name}: getData RequestException: {err}")
-            else:
-                self.logger.threaddebug(f"{device.name}: getData for sensor {sensorID}:\n{response.text}")
+                value = float(valuesDict.get(key, ""))
+            except ValueError:
+                value = -1.0
+            if value < 0:
+                errorDict[key] = f"{label} is invalid - enter a valid number (0 or more)"
+
+        if len(errorDict) > 0:
+            return False, valuesDict, errorDict
+        return True, valuesDict
+
+    def validateDeviceConfigUi(self, valuesDict, typeId, devId):
+        errorDict = indigo.Dict()
+        if typeId == 'purpleSensor' and valuesDict.get('useLocal', False):
+            if not valuesDict.get('localAddress', "").strip():
+                errorDict['localAddress'] = "Enter the sensor's IP address or host name"
+            try:
+                localUpdateFrequency = float(valuesDict.get('localUpdateFrequency', DEFAULT_LOCAL_FREQUENCY))
+            except ValueError:
+                localUpdateFrequency = 0
+            if (localUpdateFrequency < 5) or (localUpdateFrequency > 3600):
+                errorDict['localUpdateFrequency'] = "Update frequency is invalid - enter a valid number (between 5 and 3600)"
+            if len(errorDict) == 0 and not valuesDict.get('address', "").strip():
+                valuesDict['address'] = valuesDict['localAddress'].strip()
+
+        elif typeId == 'purpleArea':
+            for key, low, high in (('latitude', -90.0, 90.0), ('longitude', -180.0, 180.0), ('radius', 0.1, 100.0)):
                 try:
-                    sensor_data = response.json()['sensor']
-                except (Exception,):
-                    self.logger.error(f"{device.name}: getData 'results' key missing: {response.text}")
-                    return
-
-                sensor_aqi = int(aqi.to_iaqi(aqi.POLLUTANT_PM25, sensor_data['pm2.5'], algo=aqi.ALGO_EPA))
-                state_list = [
-                    {'key': 'sensorValue',  'value': sensor_aqi, "uiValue": f"{sensor_aqi}"},
-                    {'key': 'temperature',  'value': sensor_data['temperature'], 'decimalPlaces': 0},
-                    {'key': 'humidity',     'value': sensor_data['humidity'],    'decimalPlaces': 0},
-                    {'key': 'pressure',     'value': sensor_data['pressure'],    'decimalPlaces': 2},
-                    {'key': 'model',        'value': sensor_data['model']},
-                    {'key': 'latitude',     'value': sensor_data['latitude']},
-                    {'key': 'longitude',    'value': sensor_data['longitude']},
-                    {'key': 'altitude',     'value': sensor_data['altitude']},
-                    {'key': 'rssi',         'value': sensor_data['rssi']},
-                    {'key': 'uptime',       'value': sensor_data['uptime']},
-                    {'key': 'version',      'value': sensor_data['firmware_version']},
-                    {'key': 'hardware',     'value': sensor_data['hardware']},
-                    {'key': 'last_seen',    'value': time.strftime("%a, %d %b %Y %H:%M:%S",time.localtime(sensor_data['last_seen']))},
-                    {'key': 'pm1_0',        'value': sensor_data['pm1.0']},
-                    {'key': 'pm2_5',        'value': sensor_data['pm2.5']},
-                    {'key': 'pm10_0',       'value': sensor_data['pm10.0']},
-
-                ]
+                    value = float(valuesDict.get(key, ""))
+                except ValueError:
+                    value = None
+                if value is None or value < low or value > high:
+                    errorDict[key] = f"Enter a valid number (between {low:g} and {high:g})"
+            if len(errorDict) == 0:
+                valuesDict['address'] = f"{float(valuesDict['latitude']):.4f}, {float(valuesDict['longitude']):.4f}"
+
+        if len(errorDict) > 0:
+            return False, valuesDict, errorDict
+        return True, valuesDict
+
+    def pollDue(self, due):
+        """Poll every due key.  An unexpected error is contained to its batch, and every key of
+        the batch that wasn't rescheduled is retried, so a bad reply can't take keys off the schedule."""
+        local = [key for key in due if key in self.localDevices]
+        if local:
+            try:
+                with self.metrics.timer('getLocalData'):
+                    self.getLocalData(local)
+            except Exception as err:
+                self.recoverKeys(local, "getLocalData", err)
+        cloud = [key for key in due if key not in self.localDevices]
+        try:
+            blocked = self.budget.blocked()
+            if cloud and blocked:
+                for key in cloud:
+                    self.scheduler.retry(key, delay=blocked)
+            elif cloud and self.api_key_ok:
+                areas = [key for key in cloud if key in self.areaDevices]
+                sensors = [key for key in cloud if key not in self.areaDevices]
+                if sensors:
+                    with self.metrics.timer('getData'):
+                        self.getData(sensors)
+                if areas:
+                    with self.metrics.timer('getAreaData'):
+                        self.getAreaData(areas)
+                self.budgetCycle()
+            else:
+                delay = self.keyWait()
+                for key in cloud:
+                    self.scheduler.retry(key, delay=delay)
+        except Exception as err:
+            self.recoverKeys(cloud, "pollDue", err)
+
+    def recoverKeys(self, keys, where, err):
+        """Log an unexpected error while polling keys and retry each one that is still off the schedule."""
+        self.logger.error(f"{where}: error processing reply: {err}")
+        self.logger.debug(traceback.format_exc())
+        for key in keys:
+            if self.scheduler.in_flight(key):
+                self.scheduler.retry(key)
+
+    def getData(self, sensorIDs):
+        from poller import MAX_SENSORS_PER_REQUEST
+
+        chunks = [sensorIDs[start:start + MAX_SENSORS_PER_REQUEST] for start in range(0, len(sensorIDs), MAX_SENSORS_PER_REQUEST)]
+        for chunk in chunks:
+            self.budget.plan(len(chunk), self.apiFields)
+        for chunk, response, err in self.poller.fetch_sensors(chunks, self.apiFields, self.apiReadKey, since=self.cache.modified_since):
+            if err:
+                self.logger.error(f"getData RequestException: {err}")
+                for sensorID in chunk:
+                    self.scheduler.retry(sensorID)
+                continue
+
+            try:
+                self.processSensorReply(chunk, response)
+            except Exception as err:
+                self.recoverKeys(chunk, "getData", err)
+
+    def checkResponse(self, keys, response):
+        """Handle rate limiting and HTTP errors, return False if the reply can't be used."""
+        if response.status_code == 429:
+            delay = self.budget.rate_limited(response.headers.get('Retry-After'))
+            self.logger.warning(f"PurpleAir API rate limit reached, backing off for {delay:.0f} seconds")
+            for key in keys:
+                self.scheduler.retry(key, delay=delay)
+            return False
+        if response.status_code != 200:
+            self.logger.error(f"PurpleAir API error {response.status_code}: {response.text}")
+            for key in keys:
+                self.scheduler.retry(key)
+            return False
+        return True
+
+    def processSensorReply(self, chunk, response):
+
+        if self.traceEnabled():
+            self.logger.threaddebug(f"getData for sensors {chunk}:\n{response.text}")
+        if not self.checkResponse(chunk, response):
+            return
+        try:
+            with self.metrics.timer('parse'):
+                reply = loads(response.content)
+            fields = reply['fields']
+            rows = reply['data']
+            time_stamp = reply.get('time_stamp')
+        except (Exception,):
+            self.logger.error(f"getData 'fields' or 'data' key missing: {response.text}")
+            for sensorID in chunk:
+                self.scheduler.retry(sensorID)
+            return
+        self.budget.record(len(rows), fields[1:])    # sensor_index is free
+
+        replied = set()
+        for sensor_data in SensorReading.rows(fields, rows):
+            sensorID = str(sensor_data['sensor_index'])
+            replied.add(sensorID)
+            devID = self.sensorDevices.get(sensorID, None)
+            if devID is None:
+                self.logger.debug(f"getData: no device for sensor {sensorID}")
+                self.scheduler.observe(sensorID, sensor_data.get('last_seen'), sensor_data.get('pm2.5'))
+                continue
+            self.handleReading(sensorID, devID, sensor_data, time_stamp)
+
+        for sensorID in chunk:
+            if sensorID in replied:
+                continue
+            last_seen = self.cache.last_seen(sensorID)
+            if last_seen is not None:
+                # left out by modified_since, nothing new since the last poll
+                self.cache.unchanged(sensorID, time_stamp)
+                self.scheduler.observe(sensorID, last_seen)
+            else:
+                self.logger.warning(f"getData: no data returned for sensor {sensorID}")
+                self.scheduler.missing(sensorID)
+
+    def areaBox(self, key):
+        device = indigo.devices[self.areaDevices[key]]
+        return bounding_box(float(device.pluginProps['latitude']), float(device.pluginProps['longitude']), float(device.pluginProps['radius']))
+
+    def planArea(self, key):
+        """Plan an area request, estimated from the number of sensors in its last reply."""
+        self.budget.plan(len(self.areaIndex.get(self.areaDevices[key], ())), AREA_FIELDS)
+
+    def getAreaData(self, keys):
+
+        boxes = {key: self.areaBox(key) for key in keys if key in self.areaDevices}
+        for key in boxes:
+            self.planArea(key)
+        for key, response, err in self.poller.fetch_areas(boxes, AREA_FIELDS, self.apiReadKey, AREA_MAX_AGE):
+            if err:
+                self.logger.error(f"getAreaData RequestException: {err}")
+                self.scheduler.retry(key)
+                continue
+
+            try:
+                self.processAreaReply(key, response)
+            except Exception as err:
+                self.recoverKeys([key], "getAreaData", err)
+
+    def processAreaReply(self, key, response):
+
+        devID = self.areaDevices.get(key, None)
+        if devID is None:
+            return
+        device = indigo.devices[devID]
+        if self.traceEnabled():
+            self.logger.threaddebug(f"{device.name}: getAreaData:\n{response.text}")
+        if not self.checkResponse([key], response):
+            return
+        try:
+            with self.metrics.timer('parse'):
+                reply = loads(response.content)
+            fields = reply['fields']
+            rows = reply['data']
+        except (Exception,):
+            self.logger.error(f"{device.name}: getAreaData 'fields' or 'data' key missing: {response.text}")
+            self.scheduler.retry(key)
+            return
+        self.budget.record(len(rows), AREA_FIELDS)
+
+        grid = SpatialGrid()
+        for sensor_data in SensorReading.rows(fields, rows):
+            if None in (sensor_data.get('latitude'), sensor_data.get('longitude'), sensor_data.get('pm2.5')):
+                continue
+            grid.insert(sensor_data['latitude'], sensor_data['longitude'], sensor_data)
+        self.areaIndex[devID] = grid
+        self.scheduler.observe(key)
+
+        props = device.pluginProps
+        neighbours = grid.within(float(props['latitude']), float(props['longitude']), float(props['radius']))
+        pm25 = aggregate([(distance, data['pm2.5']) for (distance, data) in neighbours], props.get('aggregation', AGGREGATE_MEDIAN))
+        if pm25 is None:
+            # sensorValue and pm2_5 keep the last values, the error state marks them as out of date
+            if device.states.get('dataStatus') != "No Sensors":
+                self.logger.warning(f"{device.name}: no sensors reporting inside the area")
+                device.setErrorStateOnServer("no sensors")
+            state_list = [
+                {'key': 'sensorCount',      'value': 0},
+                {'key': 'dataStatus',       'value': "No Sensors"},
+            ]
+        else:
+            if device.states.get('dataStatus') == "No Sensors":
+                device.setErrorStateOnServer(None)
+            area_aqi = self.toAqi(pm25)
+            (distance, nearest) = neighbours[0]
+            state_list = [
+                {'key': 'sensorValue',      'value': area_aqi, 'uiValue': f"{area_aqi}"},
+                {'key': 'pm2_5',            'value': round(pm25, 1), 'decimalPlaces': 1},
+                {'key': 'sensorCount',      'value': len(neighbours)},
+                {'key': 'nearestSensor',    'value': str(nearest['sensor_index'])},
+                {'key': 'nearestDistance',  'value': round(distance, 2), 'decimalPlaces': 2},
+                {'key': 'dataStatus',       'value': "Current"},
+            ]
+            self.evaluateTriggers(device, state_list)
+        self.writeStates(device, state_list)
+
+    def handleReading(self, key, devID, sensor_data, time_stamp=None):
+        """Run one reading through channel validation, scheduling, cache, history and NowCast
+        and write it to its device.  key is the sensor ID, or "local-<device ID>" for LAN devices.
+        Errors are contained to this reading so one bad sensor can't stall the rest."""
+        try:
+            self.mergeChannels(key, sensor_data)
+            last_seen = sensor_data.get('last_seen')
+            self.scheduler.observe(key, last_seen, sensor_data.get('pm2.5'))
+            if not self.cache.check(key, time_stamp, last_seen):
+                self.logger.threaddebug(f"getData: sensor {key} unchanged since last poll")
+                return
+            if last_seen is not None:
+                self.history.record(key, last_seen, sensor_data)
+                if sensor_data.get('pm2.5') is not None:
+                    self.nowcasts.setdefault(key, NowCast()).update(last_seen, sensor_data['pm2.5'])
+            self.updateSensorDevice(indigo.devices[devID], sensor_data, key)
+        except Exception as err:
+            self.logger.error(f"sensor {key}: error processing reading: {err}")
+            self.logger.debug(traceback.format_exc())
+            self.scheduler.retry(key)
+
+    def dataStatus(self, last_seen, now=None):
+        if last_seen is None:
+            return "Offline"
+        age = (time.time() if now is None else now) - last_seen
+        if age > OFFLINE_FACTOR * self.staleThreshold:
+            return "Offline"
+        if age > self.staleThreshold:
+            return "Stale"
+        return "Current"
+
+    def checkBudget(self):
+        """Pick up a new budget day between polls, the stretch only changes when it has to."""
+        self.scheduler.set_stretch(self.budget.update_stretch())
+
+    def checkStale(self):
+        """Refresh dataStatus on every sensor device, so outages show up even when no reading arrives."""
+        now = time.time()
+        if now < self.next_stale_check:
+            return
+        self.next_stale_check = now + STALE_CHECK_INTERVAL
+        for key, devID in list(self.sensorDevices.items()) + list(self.localDevices.items()):
+            last_seen = self.cache.last_seen(key)
+            if last_seen is None:
+                continue    # not polled yet
+            status = self.dataStatus(last_seen, now)
+            if self.writeStates(indigo.devices[devID], [{'key': 'dataStatus', 'value': status}]) and status != "Current":
+                self.logger.warning(f"{indigo.devices[devID].name}: sensor data is {status.lower()}")
+
+    def localHost(self, key):
+        return indigo.devices[self.localDevices[key]].pluginProps['localAddress'].strip()
+
+    def getLocalData(self, keys):
+
+        hosts = {key: self.localHost(key) for key in keys if key in self.localDevices}
+        for key, response, err in self.poller.fetch_local(hosts):
+            if err:
+                self.logger.error(f"getLocalData RequestException: {err}")
+                self.scheduler.retry(key)
+                continue
+
+            try:
+                self.processLocalReply(key, response)
+            except Exception as err:
+                self.recoverKeys([key], "getLocalData", err)
+
+    def processLocalReply(self, key, response):
+
+        devID = self.localDevices.get(key, None)
+        if devID is None:
+            return
+        if self.traceEnabled():
+            self.logger.threaddebug(f"getLocalData for {key}:\n{response.text}")
+        try:
+            with self.metrics.timer('parse'):
+                sensor_data = map_local(loads(response.content))
+        except (Exception,):
+            self.logger.error(f"getLocalData invalid reply: {response.text}")
+            self.scheduler.retry(key)
+            return
+        self.handleReading(key, devID, sensor_data)
+
+    def mergeChannels(self, sensorID, sensor_data):
+        """Replace pm2.5 with the validated A/B channel value and record the channel confidence."""
+        if 'pm2.5_a' not in sensor_data:
+            return
+        previous = self.history.mean(sensorID, 'pm2.5', WINDOW_1H)
+        value, confidence, status = merge_channels(sensor_data.get('pm2.5_a'), sensor_data.get('pm2.5_b'),
+                                                   self.channelAbsThreshold, self.channelRelThreshold, previous)
+        if value is not None:
+            sensor_data['pm2.5'] = value
+        sensor_data['channel_confidence'] = confidence
+        sensor_data['channel_status'] = status
+        if confidence == CONFIDENCE_DIVERGED:
+            self.logger.debug(f"sensor {sensorID}: channels diverged (A={sensor_data.get('pm2.5_a')}, B={sensor_data.get('pm2.5_b')}), using {status}")
+
+    def updateSensorDevice(self, device, sensor_data, key):
+
+        sensor_aqi = self.toAqi(sensor_data['pm2.5'])
+        state_list = [{'key': 'sensorValue', 'value': sensor_aqi, "uiValue": f"{sensor_aqi}"}]
+        state_list.extend(build_state_list(sensor_data))
+        state_list.append({'key': 'dataStatus', 'value': self.dataStatus(sensor_data.get('last_seen'))})
+        if 'channel_status' in sensor_data:
+            state_list.append({'key': 'channelConfidence', 'value': sensor_data['channel_confidence']})
+            state_list.append({'key': 'channelStatus',     'value': sensor_data['channel_status']})
+        state_list.extend(self.averageStates(key))
+        state_list.extend(self.epaStates(key, sensor_data))
+        self.evaluateTriggers(device, state_list, sensor_data.get('last_seen'))
+        self.writeStates(device, state_list)
+
+    def evaluateTriggers(self, device, state_list, now=None):
+        """Feed a new reading to the plugin events watching the device, and execute the ones that fire.
+        Runs on the full state list, before deadbands drop the small changes."""
+        watches = self.triggerWatches.get(device.id)
+        if not watches:
+            return
+        now = time.time() if now is None else now
+        values = {state['key']: state['value'] for state in state_list}
+        fired = []
+        with self.triggerLock:
+            for trigger, watch in watches.values():
+                value = values.get(watch.state_key)
+                if value is None:
+                    continue
+                message = watch.check(value, now)
+                if message:
+                    fired.append((trigger, message))
+        for trigger, message in fired:
+            self.logger.info(f"{device.name}: {trigger.name}: {message}")
+            indigo.trigger.execute(trigger)
+
+    def toAqi(self, pm25, algo=aqi.ALGO_EPA):
+        with self.metrics.timer('aqi'):
+            return int(aqi.to_iaqi(aqi.POLLUTANT_PM25, pm25, algo=algo))
+
+    def writeStates(self, device, state_list):
+        """Send the states that changed since the last write, return the list sent."""
+        state_list = self.shadow.diff(device.id, state_list)
+        if state_list:
+            with self.metrics.timer('stateWrite'):
                 device.updateStatesOnServer(state_list)
+        return state_list
+
+    def averageStates(self, sensorID):
+        state_list = []
+        for key, field, window in (('pm2_5_1h', 'pm2.5', WINDOW_1H), ('pm2_5_8h', 'pm2.5', WINDOW_8H),
+                                   ('pm2_5_24h', 'pm2.5', WINDOW_24H), ('pm10_0_24h', 'pm10.0', WINDOW_24H)):
+            value = self.history.mean(sensorID, field, window)
+            if value is not None:
+                state_list.append({'key': key, 'value': round(value, 1), 'decimalPlaces': 1})
+
+        pm25_24h = self.history.mean(sensorID, 'pm2.5', WINDOW_24H)
+        if pm25_24h is not None:
+            aqi_24h = self.toAqi(pm25_24h)
+            state_list.append({'key': 'aqi_24h', 'value': aqi_24h, 'uiValue': f"{aqi_24h}"})
+        return state_list
+
+    def epaStates(self, sensorID, sensor_data):
+        state_list = []
+        nowcast = self.nowcasts.get(sensorID)
+        pm25_nowcast = nowcast.value() if nowcast else None
+        if pm25_nowcast is not None:
+            aqi_nowcast = self.toAqi(pm25_nowcast, aqi.ALGO_EPA_NOWCAST)
+            state_list.append({'key': 'pm2_5_nowcast', 'value': round(pm25_nowcast, 1), 'decimalPlaces': 1})
+            state_list.append({'key': 'aqi_nowcast', 'value': aqi_nowcast, 'uiValue': f"{aqi_nowcast}"})
+
+        if sensor_data.get('pm2.5_cf_1') is not None and sensor_data.get('humidity') is not None:
+            pm25_corrected = correct_pm25(sensor_data['pm2.5_cf_1'], sensor_data['humidity'])
+            aqi_corrected = self.toAqi(pm25_corrected, aqi.ALGO_EPA_PURPLEAIR)
+            state_list.append({'key': 'pm2_5_corrected', 'value': round(pm25_corrected, 1), 'decimalPlaces': 1})
+            state_list.append({'key': 'aqi_corrected', 'value': aqi_corrected, 'uiValue': f"{aqi_corrected}"})
+        return state_list
+
+    def budgetCycle(self):
+        """Stretch poll intervals to fit the daily points budget and refresh the diagnostics devices."""
+        self.scheduler.set_stretch(self.budget.update_stretch())
+        if not self.diagnosticDevices:
+            return
+        stats = self.budget.stats()
+        fetch = self.metrics.timer_stats('fetch') or {'calls': 0, 'errors': 0, 'errorRate': 0.0, 'p95': 0.0}
+        writes = self.metrics.timer_stats('stateWrite') or {'p95': 0.0}
+        state_list = [
+            {'key': 'pointsUsedToday',  'value': stats['used']},
+            {'key': 'pointsPlanned',    'value': stats['planned']},
+            {'key': 'pointsProjected',  'value': stats['projected']},
+            {'key': 'pointsBudget',     'value': stats['budget']},
+            {'key': 'pollStretch',      'value': round(stats['stretch'], 2), 'decimalPlaces': 2},
+            {'key': 'rateLimited',      'value': stats['blocked'] > 0},
+            {'key': 'fetchTimeP95',     'value': round(fetch['p95']), 'uiValue': f"{fetch['p95']:.0f} ms"},
+            {'key': 'fetchErrorRate',   'value': round(fetch['errorRate'], 1), 'decimalPlaces': 1},
+            {'key': 'requestsFailed',   'value': fetch['errors']},
+            {'key': 'stateWriteP95',    'value': round(writes['p95'], 1), 'uiValue': f"{writes['p95']:.1f} ms"},
+        ]
+        for devID in list(self.diagnosticDevices):
+            self.writeStates(indigo.devices[devID], state_list)
+
+    def logProfile(self):
+        try:
+            path = os.path.join(indigo.server.getLogsFolderPath(pluginId=self.pluginId), f"cycle-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        except (Exception,):
+            path = None
+        report = self.profiler.finish(path)
+        if report:
+            self.logger.info("Poll cycle profile" + (f", saved to {path}" if path else "") + f":\n{report}")
+
+    ########################################
+    # Menu Methods
+    ########################################
+    def logCacheStats(self):
+        stats = self.cache.stats()
+        self.logger.info(f"Response cache: {stats['sensors']} sensors, {stats['hits']} hits, {stats['misses']} misses ({stats['hitRatio']:.1f}% hit ratio)")
+        return True
+
+    def logPerformanceStats(self):
+        stats = self.metrics.stats()
+        if not stats['timers']:
+            self.logger.info("No performance data collected yet")
+        for name, timer in stats['timers'].items():
+            self.logger.info(f"{name:>12}: {timer['calls']} calls, p50 {timer['p50']:.1f} ms, p95 {timer['p95']:.1f} ms, p99 {timer['p99']:.1f} ms, "
+                             f"max {timer['max']:.1f} ms, {timer['errorRate']:.1f}% errors")
+        for name, count in sorted(stats['counters'].items()):
+            self.logger.info(f"{name:>12}: {count}")
+        return True
+
+    def profileNextCycle(self):
+        self.profiler.request()
+        self.logger.info("The next poll cycle will be profiled")
+        return True
+
+    def logApiUsage(self):
+        stats = self.budget.stats()
+        budget = stats['budget'] if stats['budget'] else "unlimited"
+        self.logger.info(f"API points today: {stats['used']} used, {stats['planned']} planned, {stats['projected']} projected, budget {budget}")
+        self.logger.info(f"Poll interval stretch {stats['stretch']:.2f}" + (f", rate limited for {stats['blocked']:.0f} seconds" if stats['blocked'] else ""))
+        return True
 
     ########################################
     # PluginConfig methods
@@ -130,7 +750,61 @@ class Plugin(indigo.PluginBase):
         if (updateFrequency < 5) or (updateFrequency > 60):
             errorDict['updateFrequency'] = "Update frequency is invalid - enter a valid number (between 5 and 60)"
 
-        if not self.read_key_ok(valuesDict.get("apiReadKey", None)):
+        try:
+            minUpdateFrequency = int(valuesDict.get('minUpdateFrequency', 5))
+            maxUpdateFrequency = int(valuesDict.get('maxUpdateFrequency', 60))
+        except ValueError:
+            minUpdateFrequency = maxUpdateFrequency = 0
+        if (minUpdateFrequency < 2) or (minUpdateFrequency > updateFrequency):
+            errorDict['minUpdateFrequency'] = "Fastest update frequency is invalid - enter a valid number (between 2 and the update frequency)"
+        if (maxUpdateFrequency < updateFrequency) or (maxUpdateFrequency > 1440):
+            errorDict['maxUpdateFrequency'] = "Slowest update frequency is invalid - enter a valid number (between the update frequency and 1440)"
+
+        try:
+            channelAbsThreshold = float(valuesDict.get('channelAbsThreshold', DEFAULT_ABS_THRESHOLD))
+        except ValueError:
+            channelAbsThreshold = -1
+        if channelAbsThreshold < 0:
+            errorDict['channelAbsThreshold'] = "Channel divergence is invalid - enter a valid number (0 or more)"
+        try:
+            channelRelThreshold = float(valuesDict.get('channelRelThreshold', DEFAULT_REL_THRESHOLD * 100))
+        except ValueError:
+            channelRelThreshold = -1
+        if channelRelThreshold < 0:
+            errorDict['channelRelThreshold'] = "Channel divergence is invalid - enter a valid number (0 or more)"
+
+        try:
+            staleMinutes = float(valuesDict.get('staleMinutes', 30))
+        except ValueError:
+            staleMinutes = 0
+        if staleMinutes < 5:
+            errorDict['staleMinutes'] = "Stale data threshold is invalid - enter a valid number (5 or more)"
+
+        try:
+            dailyPointsBudget = int(valuesDict.get('dailyPointsBudget', 0))
+        except ValueError:
+            dailyPointsBudget = -1
+        if dailyPointsBudget < 0:
+            errorDict['dailyPointsBudget'] = "Daily points budget is invalid - enter a valid number (0 for unlimited)"
+
+        try:
+            maxWorkers = int(valuesDict.get('maxWorkers', 4))
+        except ValueError:
+            maxWorkers = 0
+        if (maxWorkers < 1) or (maxWorkers > 16):
+            errorDict['maxWorkers'] = "Concurrent requests is invalid - enter a valid number (between 1 and 16)"
+
+        try:
+            requestTimeout = float(valuesDict.get('requestTimeout', 30))
+        except ValueError:
+            requestTimeout = 0
+        if (requestTimeout < 1) or (requestTimeout > 120):
+            errorDict['requestTimeout'] = "Request timeout is invalid - enter a valid number (between 1 and 120)"
+
+        key_ok = self.keyCheck.result(valuesDict.get("apiReadKey", None))
+        if key_ok is None:
+            errorDict['apiReadKey'] = "Unable to check the API Read Key, PurpleAir can't be reached"
+        elif not key_ok:
             errorDict['apiReadKey'] = "Invalid API Read Key"
 
         if len(errorDict) > 0:
@@ -143,5 +817,13 @@ class Plugin(indigo.PluginBase):
             self.indigo_log_handler.setLevel(self.logLevel)
             self.logger.debug(f"logLevel = {self.logLevel}")
             self.updateFrequency = float(valuesDict.get('updateFrequency', "1")) * 60.0
+            self.scheduler.configure(self.updateFrequency, *self.frequencyBounds(valuesDict))
+            self.channelAbsThreshold, self.channelRelThreshold = self.channelThresholds(valuesDict)
+            self.staleThreshold = float(valuesDict.get('staleMinutes', "30")) * 60.0
+            self.pollingEngine = valuesDict.get('pollingEngine', 'thread')
+            self.budget.configure(int(valuesDict.get('dailyPointsBudget', "0")))
             self.apiReadKey = valuesDict.get("apiReadKey", None)
-            self.api_key_ok = self.read_key_ok(self.apiReadKey)
+            self.maxWorkers, self.requestTimeout = self.pollerSettings(valuesDict)
+            self.closePoller()
+            self.api_key_ok = bool(self.keyCheck.cached(self.apiReadKey))   # checked by validatePrefsConfigUi
+            self.keyCheck.start(self.apiReadKey)
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# HTTP polling engine: one shared requests.Session (keep-alive, pooled connections)
+# and a bounded worker pool so that a slow request doesn't hold up the rest of the cycle.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import CircuitBreaker, CircuitOpenError, backoff_delay, DEFAULT_RETRIES
+from metrics import Metrics
+
+API_BASE = "https://api.purpleair.com/v1"
+
+# PurpleAir limits the URL length, so large sensor lists are split into several group requests
+MAX_SENSORS_PER_REQUEST = 100
+
+DEFAULT_WORKERS = 4
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+# a sensor on the LAN answers quickly or not at all, don't let one hold up the cloud requests
+LOCAL_TIMEOUT = 5.0
+LOCAL_RETRIES = 0
+
+
+class Poller(object):
+
+    def __init__(self, logger, workers=DEFAULT_WORKERS, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, retries=DEFAULT_RETRIES, metrics=None):
+        self.logger = logger
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.workers = max(1, int(workers))
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.breakers = {}
+        self.breakers_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="miniPurple-poll")
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def breaker(self, host):
+        with self.breakers_lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host)
+            return self.breakers[host]
+
+    def get(self, url, params=None, headers=None, timeout=None, retries=None):
+        """Blocking GET on the shared session, always bounded by the configured timeouts.
+        Connection errors, timeouts and 5xx replies are retried with jittered backoff; a host
+        that keeps failing trips its circuit breaker and fails fast with CircuitOpenError.
+        A final 5xx reply is returned for the caller to report.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        breaker = self.breaker(urlsplit(url).netloc)
+        try:
+            breaker.before()
+        except CircuitOpenError:
+            self.metrics.count('fetch.circuitOpen')
+            raise
+        started = time.perf_counter()
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                failed, response = err, None
+            except Exception:
+                # not worth retrying, but the breaker still has to hear about it or a trial never ends
+                breaker.failure()
+                self.metrics.record('fetch', time.perf_counter() - started, error=True)
+                raise
+            else:
+                if response.status_code < 500:
+                    breaker.success()
+                    self.metrics.record('fetch', time.perf_counter() - started, error=response.status_code >= 400)
+                    return response
+                failed = None
+            if attempt < retries:
+                delay = backoff_delay(attempt)
+                self.logger.debug(f"request to {urlsplit(url).netloc} failed, retry {attempt + 1} in {delay:.1f} seconds")
+                self.metrics.count('fetch.retries')
+                time.sleep(delay)
+        breaker.failure()
+        self.metrics.record('fetch', time.perf_counter() - started, error=True)
+        if failed is not None:
+            raise failed
+        return response
+
+    def get_sensors(self, chunk, fields, api_key, modified_since=None):
+        """Blocking group request for one chunk of sensor IDs."""
+        params = {
+            'fields': ','.join(fields),
+            'show_only': ','.join(chunk),
+            'max_age': 0,
+        }
+        if modified_since:
+            params['modified_since'] = modified_since
+        return self.get(f"{API_BASE}/sensors", params=params, headers={'X-API-Key': api_key})
+
+    def get_local(self, host):
+        """Blocking request to a sensor's own LAN endpoint, with a short timeout and no retries."""
+        return self.get(f"http://{host}/json", timeout=(min(self.timeout[0], LOCAL_TIMEOUT), LOCAL_TIMEOUT), retries=LOCAL_RETRIES)
+
+    def get_area(self, box, fields, api_key, max_age):
+        """Blocking bounding box request for every outdoor sensor inside box (nwlat, nwlng, selat, selng)."""
+        (nwlat, nwlng, selat, selng) = box
+        params = {
+            'fields': ','.join(fields),
+            'location_type': 0,
+            'max_age': max_age,
+            'nwlat': nwlat,
+            'nwlng': nwlng,
+            'selat': selat,
+            'selng': selng,
+        }
+        return self.get(f"{API_BASE}/sensors", params=params, headers={'X-API-Key': api_key})
+
+    def fetch_local(self, hosts):
+        """Fetch each LAN sensor concurrently, hosts is a dict of host keyed by the caller's key.
+        Yields (key, response, error) tuples in completion order.
+        """
+        futures = {self.executor.submit(self.get_local, host): key for key, host in hosts.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result(), None
+            except requests.exceptions.RequestException as err:
+                yield key, None, err
+
+    def fetch_areas(self, boxes, fields, api_key, max_age):
+        """Fetch each bounding box concurrently, boxes is a dict of box keyed by the caller's key.
+        Yields (key, response, error) tuples in completion order.
+        """
+        futures = {self.executor.submit(self.get_area, box, fields, api_key, max_age): key for key, box in boxes.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result(), None
+            except requests.exceptions.RequestException as err:
+                yield key, None, err
+
+    def fetch_sensors(self, chunks, fields, api_key, since=None):
+        """Fetch each chunk of sensor IDs concurrently from /v1/sensors.  since(chunk) optionally
+        supplies the modified_since time stamp for a chunk.
+        Yields (chunk, response, error) tuples in completion order, exactly one of response/error is None.
+        """
+        futures = {}
+        for chunk in chunks:
+            modified_since = since(chunk) if since else None
+            futures[self.executor.submit(self.get_sensors, chunk, fields, api_key, modified_since)] = chunk
+
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                yield chunk, future.result(), None
+            except requests.exceptions.RequestException as err:
+                yield chunk, None, err
@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Reply decoding and compact per-sensor readings.  Replies are decoded straight from the
+# response bytes, with orjson when it's installed.  Each data row becomes a SensorReading that
+# wraps the decoded row list and a field index shared by every row of the reply, instead of a
+# dict per sensor.  Values added later (the merged pm2.5, channel status) go in a small overflow dict.
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content):
+    """Decode a JSON reply body (bytes)."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def field_index(fields):
+    return {field: i for (i, field) in enumerate(fields)}
+
+
+class SensorReading(object):
+    """Read-mostly mapping of API field name to value for one row of a reply."""
+
+    __slots__ = ('index', 'row', 'extra')
+
+    def __init__(self, index, row):
+        self.index = index
+        self.row = row
+        self.extra = None
+
+    @classmethod
+    def rows(cls, fields, rows):
+        """Yield a SensorReading for every row of a {fields, data} reply."""
+        index = field_index(fields)
+        for row in rows:
+            yield cls(index, row)
+
+    def __contains__(self, field):
+        i = self.index.get(field)
+        if i is not None and i < len(self.row):
+            return True
+        return self.extra is not None and field in self.extra
+
+    def __getitem__(self, field):
+        i = self.index.get(field)
+        if i is not None and i < len(self.row):
+            return self.row[i]
+        if self.extra is not None and field in self.extra:
+            return self.extra[field]
+        raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        i = self.index.get(field)
+        if i is not None and i < len(self.row):
+            self.row[i] = value
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[field] = value
+
+    def get(self, field, default=None):
+        i = self.index.get(field)
+        if i is not None and i < len(self.row):
+            return self.row[i]
+        if self.extra is not None:
+            return self.extra.get(field, default)
+        return default
+
+    def keys(self):
+        keys = [field for (field, i) in self.index.items() if i < len(self.row)]
+        if self.extra:
+            keys.extend(field for field in self.extra if field not in self.index)
+        return keys
+
+    def items(self):
+        return [(field, self[field]) for field in self.keys()]
+
+    def __repr__(self):
+        return f"SensorReading({dict(self.items())})"
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Retry and circuit breaker helpers for the fetch layer.  Transient failures are retried
+# with jittered exponential backoff; a host that keeps failing trips its breaker and
+# requests to it fail fast until a cool-down has passed, then one trial request is let through.
+
+import random
+import threading
+import time
+
+import requests
+
+DEFAULT_RETRIES = 2
+BACKOFF_BASE = 0.5          # seconds, doubled each attempt
+BACKOFF_CAP = 8.0
+
+FAILURE_THRESHOLD = 5       # consecutive failures that open the breaker
+COOL_DOWN = 60.0            # seconds the breaker stays open, doubled each time a trial fails
+MAX_COOL_DOWN = 900.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of making a request to a host whose breaker is open."""
+
+
+def backoff_delay(attempt):
+    """Full jitter exponential backoff."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, host, threshold=FAILURE_THRESHOLD, cool_down=COOL_DOWN):
+        self.lock = threading.Lock()
+        self.host = host
+        self.threshold = threshold
+        self.base_cool_down = cool_down
+        self.cool_down = cool_down
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+
+    def before(self):
+        """Raise CircuitOpenError if a request to this host shouldn't be made now."""
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cool_down:
+                self.state = HALF_OPEN
+                self.trial = False
+            if self.state == HALF_OPEN and not self.trial:
+                self.trial = True
+                return
+            remaining = max(self.cool_down - (time.monotonic() - self.opened_at), 0)
+            raise CircuitOpenError(f"{self.host} is failing, requests suspended for {remaining:.0f} seconds")
+
+    def success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.cool_down = self.base_cool_down
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.cool_down = min(self.cool_down * 2, MAX_COOL_DOWN)
+                self.open()
+            elif self.failures >= self.threshold:
+                self.open()
+
+    def open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trial = False
@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Per-sensor adaptive poll scheduler.  A min-heap of next-due times keyed by sensor address.
+# Sensors that stop reporting back off towards max_interval, sensors whose pm2.5 is moving
+# fast speed up towards min_interval, everything else drifts back to the base interval.
+# When adaptive keys come due, the ones due shortly after are taken with them, so sensors
+# stay together in batched group requests instead of drifting into many small ones.
+
+import heapq
+import itertools
+import threading
+import time
+
+STALE_FACTOR = 2.0          # last_seen older than this many base intervals means the sensor is stale/offline
+FAST_DELTA = 5.0            # pm2.5 change (µg/m³) between polls that counts as fast moving...
+FAST_RATIO = 0.25           # ...or this fraction of the previous reading, whichever is larger
+SPEEDUP = 0.5
+BACKOFF = 2.0
+RELAX = 1.5
+COALESCE = 0.5              # adaptive keys due within this fraction of min_interval join a due batch
+
+
+class PollScheduler(object):
+
+    def __init__(self, base_interval, min_interval=None, max_interval=None):
+        self.lock = threading.Lock()
+        self.heap = []              # (due, seq, key), stale entries are skipped lazily
+        self.counter = itertools.count()
+        self.due = {}               # key -> due time of its live heap entry, absent while in flight
+        self.intervals = {}         # key -> current adaptive interval
+        self.fixed = {}             # key -> fixed interval, for keys that don't adapt
+        self.last_pm25 = {}
+        self.stretch = 1.0          # multiplier on adaptive intervals, set by the API points budget
+        self.configure(base_interval, min_interval, max_interval)
+
+    def configure(self, base_interval, min_interval=None, max_interval=None):
+        with self.lock:
+            self.base_interval = base_interval
+            self.min_interval = min(min_interval or base_interval, base_interval)
+            self.max_interval = max(max_interval or base_interval, base_interval)
+            for key, interval in self.intervals.items():
+                if key not in self.fixed:
+                    self.intervals[key] = self.clamp(interval)
+
+    def clamp(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    ########################################
+
+    def add(self, key, due=None, interval=None):
+        """Schedule a key, by default due now.  A key given an interval is always polled at
+        that interval, outside the adaptive bounds."""
+        with self.lock:
+            if interval:
+                self.fixed[key] = interval
+            self.intervals.setdefault(key, interval or self.base_interval)
+            self.push(key, time.time() if due is None else due)
+
+    def remove(self, key):
+        with self.lock:
+            self.due.pop(key, None)
+            self.intervals.pop(key, None)
+            self.fixed.pop(key, None)
+            self.last_pm25.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.intervals
+
+    def set_stretch(self, stretch, now=None):
+        """Apply a new budget stretch.  Adaptive keys already waiting have their remaining wait
+        scaled to match, so a lower stretch (a new day's budget) takes effect straight away."""
+        now = time.time() if now is None else now
+        with self.lock:
+            if stretch == self.stretch:
+                return
+            ratio = stretch / self.stretch
+            self.stretch = stretch
+            for key, due in list(self.due.items()):
+                if key not in self.fixed and due > now:
+                    self.push(key, now + (due - now) * ratio)
+
+    def in_flight(self, key):
+        """True for a key that was popped and hasn't been rescheduled yet."""
+        with self.lock:
+            return key in self.intervals and key not in self.due
+
+    def push(self, key, due):
+        self.due[key] = due
+        heapq.heappush(self.heap, (due, next(self.counter), key))
+
+    def pop_due(self, now=None):
+        """Remove and return every key that is due.  If an adaptive key is due, adaptive keys due
+        within the coalescing slack are returned too.  Popped keys stay out of the heap until
+        they are rescheduled by observe(), missing() or retry()."""
+        now = time.time() if now is None else now
+        keys = []
+        with self.lock:
+            batching = False
+            early = []          # fixed interval keys inside the slack, they keep their own time
+            horizon = now
+            while self.heap and self.heap[0][0] <= horizon:
+                entry = heapq.heappop(self.heap)
+                due, _, key = entry
+                if self.due.get(key) != due:
+                    continue
+                if due > now and key in self.fixed:
+                    early.append(entry)
+                    continue
+                del self.due[key]
+                keys.append(key)
+                if not batching and key not in self.fixed:
+                    batching = True
+                    horizon = now + COALESCE * self.min_interval
+            for entry in early:
+                heapq.heappush(self.heap, entry)
+        return keys
+
+    def next_due(self):
+        with self.lock:
+            while self.heap and self.due.get(self.heap[0][2]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def delay(self, now=None, limit=None):
+        """Seconds until the next key is due, capped at limit."""
+        now = time.time() if now is None else now
+        next_due = self.next_due()
+        delay = limit if next_due is None else max(next_due - now, 0.0)
+        if limit is not None:
+            delay = min(delay, limit)
+        return delay
+
+    ########################################
+
+    def reschedule(self, key, interval, now):
+        if key not in self.intervals:
+            return
+        self.intervals[key] = interval
+        self.push(key, now + (interval if key in self.fixed else interval * self.stretch))
+
+    def observe(self, key, last_seen=None, pm25=None, now=None):
+        """Reschedule a key after a successful reading and adapt its interval."""
+        now = time.time() if now is None else now
+        with self.lock:
+            if key in self.fixed:
+                self.reschedule(key, self.fixed[key], now)
+                return
+            interval = self.intervals.get(key, self.base_interval)
+            previous = self.last_pm25.get(key)
+            if pm25 is not None:
+                self.last_pm25[key] = pm25
+
+            if last_seen is not None and now - last_seen > STALE_FACTOR * self.base_interval:
+                interval *= BACKOFF
+            elif previous is not None and pm25 is not None and abs(pm25 - previous) >= max(FAST_DELTA, FAST_RATIO * previous):
+                interval *= SPEEDUP
+            elif interval < self.base_interval:
+                interval = min(interval * RELAX, self.base_interval)
+            else:
+                interval = self.base_interval
+            self.reschedule(key, self.clamp(interval), now)
+
+    def missing(self, key, now=None):
+        """The request succeeded but the sensor wasn't in the reply, treat it as offline."""
+        now = time.time() if now is None else now
+        with self.lock:
+            if key in self.fixed:
+                self.reschedule(key, self.fixed[key], now)
+                return
+            interval = self.intervals.get(key, self.base_interval)
+            self.reschedule(key, self.clamp(interval * BACKOFF), now)
+
+    def retry(self, key, now=None, delay=None):
+        """The request failed or wasn't made, try again after delay, by default the base interval."""
+        now = time.time() if now is None else now
+        with self.lock:
+            if key in self.intervals:
+                if delay is None:
+                    delay = self.fixed.get(key, self.base_interval * self.stretch)
+                self.push(key, now + delay)
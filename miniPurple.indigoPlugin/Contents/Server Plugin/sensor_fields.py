@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Declarative map between PurpleAir API fields and Indigo device states.
+# The same table drives the fields= query parameter and the state_list sent to Indigo,
+# so adding a state here is all that's needed to have it fetched and published.
+
+import time
+from collections import namedtuple
+
+StateField = namedtuple('StateField', ['key', 'field', 'decimalPlaces', 'formatter', 'deadband'])
+StateField.__new__.__defaults__ = (None, None, None)
+
+
+def format_timestamp(value):
+    return time.strftime("%a, %d %b %Y %H:%M:%S", time.localtime(value))
+
+
+STATE_FIELDS = (
+    StateField('temperature',   'temperature',      0,  deadband=0.5),
+    StateField('humidity',      'humidity',         0,  deadband=0.5),
+    StateField('pressure',      'pressure',         2,  deadband=0.1),
+    StateField('model',         'model'),
+    StateField('latitude',      'latitude'),
+    StateField('longitude',     'longitude'),
+    StateField('altitude',      'altitude'),
+    StateField('rssi',          'rssi',                 deadband=3),
+    StateField('uptime',        'uptime'),
+    StateField('version',       'firmware_version'),
+    StateField('hardware',      'hardware'),
+    StateField('last_seen',     'last_seen',        formatter=format_timestamp),
+    StateField('pm1_0',         'pm1.0'),
+    StateField('pm2_5',         'pm2.5'),
+    StateField('pm2_5_a',       'pm2.5_a'),
+    StateField('pm2_5_b',       'pm2.5_b'),
+    StateField('pm10_0',        'pm10.0'),
+)
+
+# numeric deadband per state key, changes smaller than this since the last write aren't sent
+DEADBANDS = {sf.key: sf.deadband for sf in STATE_FIELDS if sf.deadband is not None}
+
+MISSING = object()
+
+# fields used by computed states (sensorValue, EPA corrected AQI) rather than copied directly
+EXTRA_FIELDS = ('pm2.5', 'pm2.5_cf_1')
+
+
+def api_fields():
+    """Return the de-duplicated list of API fields needed to build every state, in table order."""
+    fields = []
+    for name in [sf.field for sf in STATE_FIELDS] + list(EXTRA_FIELDS):
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def build_state_list(sensor_data):
+    """Build the Indigo state_list for the fields present in sensor_data."""
+    state_list = []
+    for sf in STATE_FIELDS:
+        value = sensor_data.get(sf.field, MISSING)
+        if value is MISSING:
+            continue
+        if sf.formatter and value is not None:
+            value = sf.formatter(value)
+        state = {'key': sf.key, 'value': value}
+        if sf.decimalPlaces is not None:
+            state['decimalPlaces'] = sf.decimalPlaces
+        state_list.append(state)
+    return state_list
@@ -0,0 +1,40 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Per-device shadow of the last state values written to the Indigo server, so each poll
+# only sends the states that actually changed.  Noisy numeric states can have a deadband:
+# they are only re-sent once they move further than that from the last value written.
+
+import threading
+
+
+class StateShadow(object):
+
+    def __init__(self, deadbands=None):
+        self.lock = threading.Lock()
+        self.deadbands = deadbands or {}
+        self.written = {}   # device ID -> {state key: value}
+
+    def forget(self, devID):
+        with self.lock:
+            self.written.pop(devID, None)
+
+    def changed(self, key, old, new):
+        deadband = self.deadbands.get(key)
+        if deadband is not None and isinstance(old, (int, float)) and isinstance(new, (int, float)):
+            return abs(new - old) > deadband
+        return old != new
+
+    def diff(self, devID, state_list):
+        """Return the subset of state_list that differs from what was last written to devID,
+        and remember those values as written."""
+        with self.lock:
+            shadow = self.written.setdefault(devID, {})
+            changes = []
+            for state in state_list:
+                key = state['key']
+                if key in shadow and not self.changed(key, shadow[key], state['value']):
+                    continue
+                shadow[key] = state['value']
+                changes.append(state)
+            return changes
@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+####################
+# Plugin events for AQI category changes and pm threshold crossings.  Each trigger keeps a small
+# state machine that is fed the device's values as readings arrive.  A new state has to clear the
+# boundary by the hysteresis margin and then hold for the dwell time before the trigger fires, so
+# sensor jitter around a boundary never fires and each real transition fires once.
+
+from bisect import bisect_left
+
+from aqi.algos.epa import AQI as EPA_AQI
+
+EVENT_AQI_CATEGORY = 'aqiCategoryChange'
+EVENT_PM_THRESHOLD = 'pmThreshold'
+
+# EPA category names, the two highest 'aqi' bands (301-400, 401-500) are both Hazardous
+AQI_CATEGORIES = ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous")
+BAND_TOPS = [high for (low, high) in EPA_AQI.piecewise['aqi']]
+
+DEFAULT_AQI_HYSTERESIS = 5.0    # AQI points
+DEFAULT_PM_HYSTERESIS = 2.0     # µg/m³
+DEFAULT_DWELL = 5.0             # minutes
+
+
+def aqi_category(value):
+    """Index into AQI_CATEGORIES of an AQI value."""
+    return min(bisect_left(BAND_TOPS, value), len(AQI_CATEGORIES) - 1)
+
+
+class Watch(object):
+    """Debounced state of one trigger.  Subclasses work out the state a value points to."""
+
+    def __init__(self, state_key, hysteresis, dwell):
+        self.state_key = state_key      # device state the trigger watches
+        self.hysteresis = hysteresis
+        self.dwell = dwell              # seconds
+        self.state = None               # None until the first value
+        self.candidate = None
+        self.since = 0.0
+
+    def propose(self, value):
+        raise NotImplementedError
+
+    def update(self, value, now):
+        """Feed one value, return (old state, new state) when a transition is confirmed."""
+        proposed = self.propose(value)
+        if self.state is None:
+            self.state = proposed       # the first value sets the baseline without firing
+            return None
+        if proposed == self.state:
+            self.candidate = None
+            return None
+        # the dwell clock keeps running while the value stays on the same side of the current state
+        if self.candidate is None or (self.candidate > self.state) != (proposed > self.state):
+            self.since = now
+        self.candidate = proposed
+        if now - self.since < self.dwell:
+            return None
+        old, self.state, self.candidate = self.state, proposed, None
+        return old, proposed
+
+    def check(self, value, now):
+        """Feed one value, return a description of the transition if the trigger should fire."""
+        raise NotImplementedError
+
+
+class CategoryWatch(Watch):
+
+    def __init__(self, state_key, hysteresis, dwell, direction="any", category="any"):
+        Watch.__init__(self, state_key, hysteresis, dwell)
+        self.direction = direction      # "any", "worse" or "better"
+        self.category = category        # "any" or the index of the category entered
+
+    def propose(self, value):
+        if self.state is None:
+            return aqi_category(value)
+        # move only once the value is past the boundary by the hysteresis margin
+        up = aqi_category(value - self.hysteresis)
+        if up > self.state:
+            return up
+        down = aqi_category(value + self.hysteresis)
+        if down < self.state:
+            return down
+        return self.state
+
+    def check(self, value, now):
+        change = self.update(value, now)
+        if change is None:
+            return None
+        old, new = change
+        if (self.direction == "worse" and new < old) or (self.direction == "better" and new > old):
+            return None
+        if self.category != "any" and int(self.category) != new:
+            return None
+        return f"AQI {value} changed from {AQI_CATEGORIES[old]} to {AQI_CATEGORIES[new]}"
+
+
+class ThresholdWatch(Watch):
+    """State is True above the threshold.  A rising trigger fires at the threshold and re-arms
+    once the value drops the hysteresis below it, a falling trigger the other way round."""
+
+    def __init__(self, state_key, hysteresis, dwell, threshold, direction="rising"):
+        Watch.__init__(self, state_key, hysteresis, dwell)
+        self.threshold = threshold
+        self.direction = direction      # "rising" or "falling"
+
+    def propose(self, value):
+        if self.direction == "rising":
+            if self.state:
+                return value >= self.threshold - self.hysteresis
+            return value >= self.threshold
+        if self.state is False:
+            return value >= self.threshold + self.hysteresis
+        return value >= self.threshold
+
+    def check(self, value, now):
+        change = self.update(value, now)
+        if change is None:
+            return None
+        old, new = change
+        if new != (self.direction == "rising"):
+            return None
+        return f"{self.state_key} {value} {'rose above' if new else 'fell below'} {self.threshold:g}"
+
+
+def make_watch(type_id, props):
+    """Build the Watch of a plugin event from its pluginProps.  Raises ValueError for bad values."""
+    dwell = float(props.get('dwellMinutes', DEFAULT_DWELL)) * 60.0
+    if type_id == EVENT_AQI_CATEGORY:
+        return CategoryWatch(props.get('aqiState', 'sensorValue'), float(props.get('hysteresis', DEFAULT_AQI_HYSTERESIS)), dwell,
+                             direction=props.get('direction', "any"), category=props.get('category', "any"))
+    if type_id == EVENT_PM_THRESHOLD:
+        return ThresholdWatch(props.get('pmState', 'pm2_5'), float(props.get('hysteresis', DEFAULT_PM_HYSTERESIS)), dwell,
+                              float(props['threshold']), direction=props.get('direction', "rising"))
+    raise ValueError(f"unknown event type {type_id}")
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Puts the plugin and the ``indigo`` stub of the benchmarks on ``sys.path``,
+so the plugin modules can be imported outside the Indigo server.
+
+Run from the repository root with ``python -m pytest tests``.
+"""
+
+import builtins
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_DIR = os.path.join(ROOT, "miniPurple.indigoPlugin", "Contents", "Server Plugin")
+BENCHMARKS_DIR = os.path.join(ROOT, "benchmarks")
+
+for path in (BENCHMARKS_DIR, PLUGIN_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import indigo                                   # noqa: E402  the stub in benchmarks/
+
+builtins.indigo = indigo                        # the Indigo server provides it as a builtin
+
+import pytest                                   # noqa: E402
+
+import support                                  # noqa: E402  benchmarks/support.py
+from fake_purpleair import FakePurpleAir        # noqa: E402
+
+
+@pytest.fixture
+def fake_purpleair():
+    """Fake PurpleAir API on a free local port.  ``local_host(sensor_id)``
+    starts that sensor's own LAN ``/json`` endpoint on another port."""
+    server = FakePurpleAir(sensors=4).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def plugin(fake_purpleair):
+    """A started Plugin whose requests go to the fake server."""
+    instance = support.make_plugin(fake_purpleair)
+    yield instance
+    for device in list(indigo.devices.values()):
+        instance.deviceStopComm(device)
+    indigo.devices.clear()
+    instance.shutdown()
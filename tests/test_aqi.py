@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Multi-pollutant AQI: the result, and whether bad input raises, must not
+depend on the order the pollutants are given in.
+"""
+
+import pytest
+
+import aqi
+from aqi.algos import get_algo
+
+PM25_HIGH = (aqi.POLLUTANT_PM25, '400')     # IAQI 434, above the 8-hour ozone scale
+O3_BAD = (aqi.POLLUTANT_O3_8H, 'abc')
+
+
+def raised(func, *args):
+    """Type of the exception func raises."""
+    with pytest.raises(Exception) as info:
+        func(*args)
+    return info.type
+
+
+def test_aqi_is_max_iaqi():
+    ccs = [(aqi.POLLUTANT_PM25, '40.3'), (aqi.POLLUTANT_PM10, '433'), (aqi.POLLUTANT_O3_8H, '0.160')]
+    assert aqi.to_aqi(ccs) == 311
+    assert aqi.to_aqi(list(reversed(ccs))) == 311
+    _aqi, iaqis = get_algo(aqi.ALGO_EPA).aqi(ccs, iaqis=True)
+    assert (_aqi, iaqis) == (311, {aqi.POLLUTANT_PM25: 113, aqi.POLLUTANT_PM10: 311, aqi.POLLUTANT_O3_8H: 218})
+
+
+def test_aqi_last_concentration_wins():
+    assert aqi.to_aqi([(aqi.POLLUTANT_PM25, '250.7'), (aqi.POLLUTANT_PM25, '18.9')]) == 65
+
+
+def test_aqi_no_covered_pollutant():
+    assert aqi.to_aqi([]) is None
+    assert get_algo(aqi.ALGO_EPA).aqi([], iaqis=True) == (None, {})
+    assert aqi.to_aqi_many([[], [(aqi.POLLUTANT_PM25, '18.9')]]) == [None, 65]
+
+
+@pytest.mark.parametrize('ccs', [[PM25_HIGH, O3_BAD], [O3_BAD, PM25_HIGH]])
+def test_aqi_bad_concentration_raises_in_any_order(ccs):
+    expected = raised(aqi.to_iaqi, *O3_BAD)
+    with pytest.raises(expected):
+        aqi.to_aqi(ccs)
+    with pytest.raises(expected):
+        get_algo(aqi.ALGO_EPA).aqi(ccs, iaqis=True)
+    with pytest.raises(expected):
+        aqi.to_aqi_many([[PM25_HIGH], ccs])
+
+
+def test_aqi_many_matches_aqi():
+    stations = [[(aqi.POLLUTANT_PM25, str(pm25)), (aqi.POLLUTANT_O3_8H, '0.%03d' % o3)]
+                for pm25 in range(0, 500, 7) for o3 in range(0, 200, 13)]
+    assert aqi.to_aqi_many(stations) == [int(aqi.to_aqi(ccs)) for ccs in stations]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""The compiled breakpoint tables must give exactly what the Decimal
+reference implementation gives, for every quantized concentration of every
+EPA and MEP pollutant, and for every integer IAQI on the way back.
+"""
+
+from decimal import Decimal
+
+import pytest
+
+import aqi
+from aqi.algos import get_algo
+
+# quantization steps checked past the top breakpoint, where both sides fail
+OVERSHOOT = 10
+
+CASES = [(algo, elem)
+         for algo in (aqi.ALGO_EPA, aqi.ALGO_MEP)
+         for elem in sorted(get_algo(algo).piecewise['bp'])]
+
+
+def quantized(_aqi, elem):
+    """Every concentration on the pollutant's precision grid, as str, from
+    0 to a little past the top breakpoint."""
+    prec = _aqi.piecewise['prec'][elem]
+    top = max(bphi for (bplo, bphi) in _aqi.piecewise['bp'][elem])
+    steps = int((Decimal(top) / prec).to_integral_value()) + OVERSHOOT
+    return [str(prec * n) for n in range(steps + 1)]
+
+
+def outcome(func, *args):
+    """Result of func, or the type of the exception it raised."""
+    try:
+        return func(*args)
+    except Exception as err:
+        return type(err)
+
+
+@pytest.mark.parametrize('algo,elem', CASES)
+def test_iaqi_matches_decimal(algo, elem):
+    _aqi = get_algo(algo)
+    table = _aqi.compiled(elem)
+    mismatches = []
+    for cc in quantized(_aqi, elem):
+        expected = outcome(_aqi.decimal_iaqi, elem, cc)
+        if outcome(_aqi.iaqi, elem, cc) != expected:
+            mismatches.append((cc, 'iaqi'))
+        if table is not None and table.iaqi(cc) not in (None, expected):
+            mismatches.append((cc, 'CompiledBreakpoints.iaqi'))
+        if table is not None and table.lookup(float(cc)) not in (None, outcome(_aqi.decimal_iaqi, elem, float(cc))):
+            mismatches.append((cc, 'CompiledBreakpoints.lookup(float)'))
+    assert mismatches == []
+
+
+@pytest.mark.parametrize('algo,elem', CASES)
+def test_cc_matches_decimal(algo, elem):
+    _aqi = get_algo(algo)
+    mismatches = []
+    for _iaqi in range(_aqi.piecewise['aqi'][-1][1] + 1):
+        if outcome(_aqi.cc, elem, _iaqi) != outcome(_aqi.decimal_cc, elem, _iaqi):
+            mismatches.append(_iaqi)
+    assert mismatches == []
+
+
+@pytest.mark.parametrize('algo,elem', CASES)
+def test_iaqi_many_matches_iaqi(algo, elem):
+    _aqi = get_algo(algo)
+    ccs = [cc for cc in quantized(_aqi, elem) if not isinstance(outcome(_aqi.decimal_iaqi, elem, cc), type)]
+    floats = [float(cc) for cc in ccs]
+    assert _aqi.iaqi_many(elem, ccs) == [int(_aqi.decimal_iaqi(elem, cc)) for cc in ccs]
+    # floats go through the array path when NumPy is installed
+    assert _aqi.iaqi_many(elem, floats) == [int(_aqi.decimal_iaqi(elem, cc)) for cc in floats]
+
+
+def test_iaqi_many_rejects_like_iaqi():
+    with pytest.raises(outcome(aqi.to_iaqi, aqi.POLLUTANT_PM25, 'abc')):
+        aqi.to_iaqi_many(aqi.POLLUTANT_PM25, ['12.0', 'abc'])
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Area devices against the fake API, whose sensors sit on a grid from ORIGIN."""
+
+import indigo
+
+from fake_purpleair import ORIGIN
+
+
+def add_area(plugin, latitude, longitude, radius="2"):
+    dev_id = len(indigo.devices) + 1
+    props = {'latitude': str(latitude), 'longitude': str(longitude), 'radius': radius, 'aggregation': "median"}
+    device = indigo.devices.add(indigo.Device(dev_id, f"Area {dev_id}", 'purpleArea', "", props))
+    plugin.deviceStartComm(device)
+    return device
+
+
+def test_area_without_sensors_is_flagged(plugin, fake_purpleair):
+    device = add_area(plugin, *ORIGIN)
+    key = f"area-{device.id}"
+    plugin.getAreaData([key])
+    assert device.states['dataStatus'] == "Current"
+    assert device.states['sensorCount'] > 0
+    assert device.errorState is None
+
+    # move the area away from every sensor
+    device.pluginProps['latitude'] = str(ORIGIN[0] + 10.0)
+    plugin.getAreaData([key])
+    assert device.states['sensorCount'] == 0
+    assert device.states['dataStatus'] == "No Sensors"
+    assert device.errorState == "no sensors"
+
+    device.pluginProps['latitude'] = str(ORIGIN[0])
+    plugin.getAreaData([key])
+    assert device.states['dataStatus'] == "Current"
+    assert device.errorState is None
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Streaming batch conversion of the 'aqi' command."""
+
+import json
+
+import aqi
+from aqi.batch import ERROR_COLUMN, convert_chunk, run_batch
+
+
+def test_ndjson_bad_rows_are_flagged():
+    lines = ['{"pm25": "12.0"}\n', '[1, 2]\n', '"text"\n', '{not json\n', '\n', '{"pm25": "abc", "id": 7}\n']
+    (out, errors) = convert_chunk(aqi.ALGO_EPA, 'aqi', 'ndjson', None, False, lines)
+    assert errors == 4
+    assert out[0] == {'pm25': "12.0", 'aqi': 50}
+    assert out[1] == {ERROR_COLUMN: True}
+    assert out[2] == {ERROR_COLUMN: True}
+    assert out[3] == {ERROR_COLUMN: True}
+    assert out[4] == {'pm25': "abc", 'id': 7, ERROR_COLUMN: True}
+
+
+def test_run_batch_continues_past_bad_rows(tmp_path):
+    source = tmp_path / "in.ndjson"
+    source.write_text('{"pm25": 35.4}\n[1, 2]\n{"pm25": "55.5"}\n')
+    target = tmp_path / "out.ndjson"
+    (rows, errors) = run_batch(aqi.ALGO_EPA, str(source), output=str(target), report=None)
+    assert (rows, errors) == (3, 1)
+    records = [json.loads(line) for line in target.read_text().splitlines()]
+    assert [record.get('aqi') for record in records] == [100, None, 151]
+
+
+def test_csv_rows(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_text("id,pm25,pm10\na,12.0,54\nb,abc,10\n")
+    target = tmp_path / "out.csv"
+    (rows, errors) = run_batch(aqi.ALGO_EPA, str(source), output=str(target), report=None)
+    assert (rows, errors) == (2, 1)
+    assert target.read_text().splitlines() == ["id,pm25,pm10,aqi,error", "a,12.0,54,50,", "b,abc,10,,True"]
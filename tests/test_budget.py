@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""API points accounting and the poll interval stretch."""
+
+import time
+from email.utils import formatdate
+
+import pytest
+
+from budget import (PointsBudget, estimate_points, parse_retry_after,
+                    MAX_STRETCH, MIN_BACKOFF, MAX_BACKOFF)
+from scheduler import PollScheduler
+
+FIELDS = ['f'] * 20
+MIDNIGHT = time.mktime((2026, 1, 5, 0, 0, 0, 0, 0, -1))     # local midnight
+
+
+def simulate(daily_budget, days=3, sensors=100, base=600):
+    """Poll one chunk of sensors through a PollScheduler stretched by the budget, the
+    way the plugin does, checking between polls.  Return points used per day and the stretch."""
+    budget = PointsBudget(daily_budget)
+    scheduler = PollScheduler(base, 300, 3600)
+    scheduler.add('chunk', due=MIDNIGHT)
+    used = [0] * days
+    now = MIDNIGHT
+    while now < MIDNIGHT + days * 86400:
+        if scheduler.pop_due(now=now):
+            blocked = budget.blocked(now)
+            if blocked:
+                scheduler.retry('chunk', now=now, delay=blocked)
+            else:
+                budget.plan(sensors, FIELDS, now=now)
+                used[int((now - MIDNIGHT) // 86400)] += budget.record(sensors, FIELDS, now=now)
+                scheduler.observe('chunk', now=now)
+        scheduler.set_stretch(budget.update_stretch(now=now), now=now)
+        now += 10
+    return used, budget.stretch
+
+
+def test_estimate_points():
+    assert estimate_points(100, FIELDS) == 2000
+
+
+def test_parse_retry_after():
+    now = time.time()
+    assert parse_retry_after("120", now) == 120.0
+    assert parse_retry_after("-5", now) == 0.0
+    assert parse_retry_after(formatdate(now + 300, usegmt=True), now) == pytest.approx(300, abs=1)
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 -0000", 1445412480 - 60) == 60.0
+    assert parse_retry_after("soon", now) is None
+
+
+def test_rate_limited_backoff():
+    budget = PointsBudget()
+    assert budget.rate_limited("30", now=1000.0) == 30.0
+    assert budget.blocked(now=1010.0) == 20.0
+    assert budget.rate_limited(None, now=1000.0) == MIN_BACKOFF
+    assert budget.rate_limited("not a date", now=1000.0) == 2 * MIN_BACKOFF
+    for _ in range(10):
+        delay = budget.rate_limited(now=1000.0)
+    assert delay == MAX_BACKOFF
+    budget.record(1, FIELDS, now=1000.0)
+    assert budget.rate_limited(now=1000.0) == MIN_BACKOFF
+
+
+def test_unlimited_budget_never_stretches():
+    budget = PointsBudget(0)
+    for i in range(10):
+        budget.record(1000, FIELDS, now=MIDNIGHT + i * 60)
+    assert budget.update_stretch(now=MIDNIGHT + 600) == 1.0
+
+
+def test_rate_spans_long_intervals():
+    # one request every 2 hours, longer than the rate window
+    budget = PointsBudget(100000)
+    budget.stretch = 12.0
+    for i in range(4):
+        budget.record(100, FIELDS, now=MIDNIGHT + i * 7200)
+    now = MIDNIGHT + 3 * 7200
+    assert budget.rate(now) == pytest.approx(2000 / 7200.0)
+    assert budget.base_rate(now) == pytest.approx(12 * 2000 / 7200.0)
+
+
+@pytest.mark.parametrize('daily_budget', [20000, 100000])
+def test_stretch_uses_the_budget(daily_budget):
+    (used, stretch) = simulate(daily_budget)
+    for points in used:
+        assert 0.8 * daily_budget <= points <= daily_budget
+    assert stretch < MAX_STRETCH
+
+
+def test_ample_budget_polls_at_base_interval():
+    (used, stretch) = simulate(10 ** 7)
+    assert used == [144 * 2000] * 3
+    assert stretch == 1.0
+
+
+def test_spent_budget_blocks_until_midnight():
+    budget = PointsBudget(5000)
+    now = MIDNIGHT + 23 * 3600
+    for i in range(3):
+        budget.record(100, FIELDS, now=now + i * 600)
+    now += 1200
+    assert budget.update_stretch(now=now) == MAX_STRETCH
+    assert budget.blocked(now=now) == pytest.approx(MIDNIGHT + 86400 - now, abs=1)
+
+
+def test_new_day_resets_stretch():
+    budget = PointsBudget(5000)
+    for i in range(3):
+        budget.record(100, FIELDS, now=MIDNIGHT + 23 * 3600 + i * 600)
+    budget.update_stretch(now=MIDNIGHT + 23 * 3600 + 1200)
+    assert budget.stretch == MAX_STRETCH
+    tomorrow = MIDNIGHT + 86400 + 60
+    assert budget.projected(now=tomorrow) >= 0
+    assert budget.stretch == 1.0
+    assert budget.stats(now=tomorrow)['used'] == 0
+
+
+def test_configure_remeasures():
+    budget = PointsBudget(0)
+    for i in range(7):
+        budget.record(100, FIELDS, now=MIDNIGHT + i * 600)
+    now = MIDNIGHT + 6 * 600
+    assert budget.update_stretch(now=now) == 1.0
+    budget.configure(20000)
+    assert budget.update_stretch(now=now) > 1.0
+
+
+def test_plan_counts_planned_points():
+    budget = PointsBudget()
+    budget.plan(10, FIELDS, now=MIDNIGHT)
+    budget.plan(5, FIELDS, now=MIDNIGHT)
+    assert budget.stats(now=MIDNIGHT)['planned'] == 300
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Streaming NowCast and the US EPA PurpleAir correction, against values
+worked by hand from the EPA formulas.
+"""
+
+import pytest
+
+from aqi.algos.epa_nowcast import NowCast
+from aqi.algos.epa_purpleair import correct_pm25
+
+HOUR = 3600
+T0 = 1700000000 // HOUR * HOUR      # top of an hour
+
+
+def nowcast_of(hourly):
+    """NowCast fed with hourly averages, newest first, None for hours without
+    data.  Each hour gets two readings around its average.  The newest hour
+    always has data, the clock only moves with readings."""
+    nowcast = NowCast()
+    for (age, cc) in reversed(list(enumerate(hourly))):
+        if cc is not None:
+            start = T0 - age * HOUR
+            nowcast.update(start + 600, cc - 1.0)
+            nowcast.update(start + 3000, cc + 1.0)
+    return nowcast
+
+
+def test_nowcast_steady_concentration():
+    assert nowcast_of([12.0] * 12).value() == pytest.approx(12.0)
+
+
+def test_nowcast_weight_is_min_over_max():
+    # w = 20 / 25 = 0.8
+    expected = (20 + 0.8 * 25 + 0.64 * 24 + 0.512 * 22) / (1 + 0.8 + 0.64 + 0.512)
+    assert nowcast_of([20.0, 25.0, 24.0, 22.0]).value() == pytest.approx(expected)
+    assert expected == pytest.approx(22.5691, abs=1e-4)
+
+
+def test_nowcast_weight_floor():
+    # w = 10 / 100 = 0.1, raised to 0.5
+    assert nowcast_of([10.0, 100.0]).value() == pytest.approx((10 + 0.5 * 100) / 1.5)
+    hourly = [13.0, 16.0, 10.0, 21.0, 74.0, 64.0, 53.0, 82.0, 90.0, 75.0, 80.0, 50.0]
+    expected = sum(cc * 0.5 ** i for (i, cc) in enumerate(hourly)) / sum(0.5 ** i for i in range(12))
+    assert nowcast_of(hourly).value() == pytest.approx(expected)
+    assert expected == pytest.approx(17.4139, abs=1e-4)
+
+
+def test_nowcast_zero_concentrations():
+    assert nowcast_of([0.0, 0.0, 0.0]).value() == 0.0
+
+
+def test_nowcast_missing_hours_keep_their_weight():
+    # hour 2 is missing: its term is left out but the weight still decays past it
+    assert nowcast_of([10.0, None, 20.0]).value() == pytest.approx((10 + 0.25 * 20) / 1.25)
+    assert nowcast_of([10.0, 20.0, None, None, 40.0]).value() == \
+        pytest.approx((10 + 0.5 * 20 + 0.0625 * 40) / 1.5625)
+
+
+def test_nowcast_needs_two_of_the_three_latest_hours():
+    assert NowCast().value() is None
+    assert nowcast_of([10.0]).value() is None
+    assert nowcast_of([10.0, None, None, 20.0, 20.0]).value() is None
+    assert nowcast_of([10.0, None, 20.0]).value() is not None
+    assert nowcast_of([10.0, 20.0]).value() is not None
+
+
+def test_nowcast_clears_buckets_across_gaps():
+    nowcast = NowCast()
+    for age in range(3):
+        nowcast.update(T0 - age * HOUR, 50.0)
+    nowcast.update(T0 + 4 * HOUR, 10.0)
+    assert nowcast.averages()[:8] == [10.0, None, None, None, 50.0, 50.0, 50.0, None]
+    assert nowcast.value() is None
+    # a gap longer than the window leaves nothing of the old hours
+    nowcast.update(T0 + 30 * HOUR, 10.0)
+    nowcast.update(T0 + 31 * HOUR, 20.0)
+    assert nowcast.averages() == [20.0, 10.0] + [None] * 10
+    assert nowcast.value() == pytest.approx((20 + 0.5 * 10) / 1.5)
+
+
+def test_nowcast_late_readings():
+    nowcast = NowCast()
+    nowcast.update(T0, 10.0)
+    nowcast.update(T0 - HOUR, 30.0)             # late but inside the window
+    nowcast.update(T0 - 12 * HOUR, 1000.0)      # older than the window, ignored
+    assert nowcast.averages()[:2] == [10.0, 30.0]
+    assert nowcast.averages()[2:] == [None] * 10
+
+
+@pytest.mark.parametrize('pa,rh,expected', [
+    (20.0, 50.0, 0.524 * 20 - 0.0862 * 50 + 5.75),                  # 11.92
+    (40.0, 50.0, (0.786 * 0.5 + 0.524 * 0.5) * 40 - 0.0862 * 50 + 5.75),
+    (100.0, 40.0, 0.786 * 100 - 0.0862 * 40 + 5.75),                # 80.902
+    (235.0, 50.0, (0.69 * 0.5 + 0.786 * 0.5) * 235 - 0.0862 * 50 * 0.5
+     + 2.966 * 0.5 + 5.75 * 0.5 + 8.84e-4 * 235 ** 2 * 0.5),
+    (300.0, 50.0, 2.966 + 0.69 * 300 + 8.84e-4 * 300 ** 2),         # 289.526
+])
+def test_correct_pm25_pieces(pa, rh, expected):
+    assert correct_pm25(pa, rh) == pytest.approx(expected)
+
+
+def test_correct_pm25_reference_values():
+    assert correct_pm25(20.0, 50.0) == pytest.approx(11.92)
+    assert correct_pm25(40.0, 50.0) == pytest.approx(27.64)
+    assert correct_pm25(100.0, 40.0) == pytest.approx(80.902)
+    assert correct_pm25(235.0, 50.0) == pytest.approx(200.04245)
+    assert correct_pm25(300.0, 50.0) == pytest.approx(289.526)
+    assert correct_pm25('20', '50') == pytest.approx(11.92)
+
+
+@pytest.mark.parametrize('pa,rh,expected', [
+    (30.0, 50.0, 0.524 * 30 - 0.0862 * 50 + 5.75),
+    (50.0, 50.0, 0.786 * 50 - 0.0862 * 50 + 5.75),
+    (210.0, 50.0, 0.786 * 210 - 0.0862 * 50 + 5.75),
+    (260.0, 50.0, 2.966 + 0.69 * 260 + 8.84e-4 * 260 ** 2),
+])
+def test_correct_pm25_is_continuous_at_breakpoints(pa, rh, expected):
+    assert correct_pm25(pa, rh) == pytest.approx(expected)
+    assert correct_pm25(pa - 1e-9, rh) == pytest.approx(expected)
+    assert correct_pm25(pa + 1e-9, rh) == pytest.approx(expected)
+
+
+def test_correct_pm25_never_negative():
+    assert correct_pm25(0.0, 90.0) == 0.0
+    assert correct_pm25(2.0, 100.0) == 0.0
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""LAN polling: mapping a sensor's /json reply, and polling LAN devices
+against fake sensors that each answer on their own address."""
+
+import json
+import socket
+import time
+
+import indigo
+
+import poller
+import support
+from local import map_local, parse_datetime
+
+REPLY = {
+    'SensorId':             "84:f3:eb:00:00:01",
+    'DateTime':             "2023/06/01T12:34:56z",
+    'lat':                  37.7,
+    'lon':                  -122.5,
+    'rssi':                 -58,
+    'uptime':               3600,
+    'version':              "7.02",
+    'hardwarediscovered':   "2.0+BME280+PMSX003-B+PMSX003-A",
+    'current_temp_f':       71,
+    'current_humidity':     40,
+    'pressure':             1012.5,
+    'pm1_0_atm':            4.0,
+    'pm1_0_atm_b':          6.0,
+    'pm2_5_atm':            10.0,
+    'pm2_5_atm_b':          12.0,
+    'pm10_0_atm':           14.0,
+    'pm2_5_cf_1':           11.0,
+}
+
+
+class Response(object):
+
+    def __init__(self, content):
+        self.content = content
+        self.text = content.decode('utf-8', 'replace')
+
+
+def test_parse_datetime():
+    assert parse_datetime("2023/06/01T12:34:56z") == 1685622896
+    assert parse_datetime("not a date") is None
+    assert parse_datetime(None) is None
+
+
+def test_map_local_fields_and_channels():
+    sensor_data = map_local(REPLY)
+    assert sensor_data['latitude'] == 37.7
+    assert sensor_data['firmware_version'] == "7.02"
+    assert sensor_data['temperature'] == 71
+    assert sensor_data['pm2.5_a'] == 10.0
+    assert sensor_data['pm2.5_b'] == 12.0
+    # averaged over the channels present
+    assert sensor_data['pm1.0'] == 5.0
+    assert sensor_data['pm2.5'] == 11.0
+    assert sensor_data['pm10.0'] == 14.0
+    assert sensor_data['pm2.5_cf_1'] == 11.0
+    assert sensor_data['last_seen'] == 1685622896
+
+
+def test_map_local_missing_values():
+    before = int(time.time())
+    sensor_data = map_local({'pm2_5_atm': 8.0, 'pm2_5_atm_b': None, 'DateTime': "garbage"})
+    assert sensor_data['pm2.5'] == 8.0
+    assert 'pm1.0' not in sensor_data
+    assert 'latitude' not in sensor_data
+    assert sensor_data['last_seen'] >= before
+
+
+def test_local_poll_reads_each_sensor(plugin, fake_purpleair):
+    devices = support.add_sensors(plugin, fake_purpleair, 3, local=True)
+    keys = list(plugin.localDevices)
+    plugin.pollDue(plugin.scheduler.pop_due(now=time.time() + 3600))
+
+    for device in devices:
+        index = int(device.address)
+        endpoint = fake_purpleair.endpoints[index]
+        assert endpoint.requests == 1
+        assert device.states['latitude'] == fake_purpleair.sensors.positions[index][0]
+        assert device.states['longitude'] == fake_purpleair.sensors.positions[index][1]
+        assert device.states['dataStatus'] == "Current"
+        assert isinstance(device.states['sensorValue'], int)
+    assert fake_purpleair.requests == 1         # only the key check went to the API
+    assert all(key in plugin.scheduler.due for key in keys)
+
+
+def test_process_local_reply_updates_device(plugin, fake_purpleair):
+    (device,) = support.add_sensors(plugin, fake_purpleair, 1, local=True)
+    key = f"local-{device.id}"
+    plugin.scheduler.pop_due(now=time.time() + 3600)
+
+    plugin.processLocalReply(key, Response(json.dumps(REPLY).encode('utf-8')))
+    assert device.states['pm2_5'] == 11.0
+    assert device.states['channelStatus']
+    assert plugin.history.mean(key, 'pm2.5', 3600) == 11.0
+    assert key in plugin.scheduler.due
+
+
+def test_process_local_reply_invalid(plugin, fake_purpleair):
+    (device,) = support.add_sensors(plugin, fake_purpleair, 1, local=True)
+    key = f"local-{device.id}"
+    plugin.scheduler.pop_due(now=time.time() + 3600)
+
+    plugin.processLocalReply(key, Response(b"<html>not json</html>"))
+    assert 'pm2_5' not in device.states
+    assert key in plugin.scheduler.due          # retried, not dropped
+
+
+def test_hung_lan_sensor_does_not_hold_up_cloud_polls(plugin, fake_purpleair, monkeypatch):
+    monkeypatch.setattr(poller, 'LOCAL_TIMEOUT', 0.5)
+    # accepts connections and never answers
+    hung = socket.socket()
+    hung.bind(('127.0.0.1', 0))
+    hung.listen(8)
+    try:
+        dev_id = len(indigo.devices) + 1
+        props = {'useLocal': True, 'localAddress': f"127.0.0.1:{hung.getsockname()[1]}", 'localUpdateFrequency': "30"}
+        local = indigo.devices.add(indigo.Device(dev_id, "Hung", 'purpleSensor', "", props))
+        plugin.deviceStartComm(local)
+        cloud = support.add_sensors(plugin, fake_purpleair, 2)
+
+        started = time.perf_counter()
+        plugin.pollDue(plugin.scheduler.pop_due(now=time.time() + 3600))
+        assert time.perf_counter() - started < 2.0      # one short timeout, no retries
+        assert all('pm2_5' in device.states for device in cloud)
+        assert 'pm2_5' not in local.states
+        assert f"local-{local.id}" in plugin.scheduler.due
+    finally:
+        hung.close()
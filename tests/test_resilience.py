@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Retries and circuit breaking of the fetch layer, on a fake session and clock."""
+
+import logging
+
+import pytest
+import requests
+
+import poller
+import resilience
+from resilience import (CircuitBreaker, CircuitOpenError, backoff_delay,
+                        CLOSED, OPEN, HALF_OPEN, COOL_DOWN, MAX_COOL_DOWN, FAILURE_THRESHOLD,
+                        BACKOFF_BASE, BACKOFF_CAP)
+
+URL = "https://api.example.com/v1/sensors"
+
+
+class FakeClock(object):
+    """Stands in for the time module: sleeping only moves the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession(object):
+    """Plays back a script of outcomes, a status code or an exception to raise."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, timeout))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, 'time', fake)
+    monkeypatch.setattr(poller, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def make_poller():
+    made = []
+
+    def make(*outcomes, retries=2):
+        po = poller.Poller(logging.getLogger("test"), retries=retries)
+        po.session.close()
+        po.session = FakeSession(*outcomes)
+        made.append(po)
+        return po
+    yield make
+    for po in made:
+        po.close()
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.before()
+        breaker.failure()
+
+
+def test_backoff_delay_is_bounded():
+    for attempt in range(8):
+        for _ in range(50):
+            assert 0 <= backoff_delay(attempt) <= min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+
+
+def test_breaker_opens_at_threshold(clock):
+    breaker = CircuitBreaker("host")
+    fail(breaker, FAILURE_THRESHOLD - 1)
+    assert breaker.state == CLOSED
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("host")
+    for _ in range(3):
+        fail(breaker, FAILURE_THRESHOLD - 1)
+        breaker.before()
+        breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+def test_breaker_lets_one_trial_through_after_cool_down(clock):
+    breaker = CircuitBreaker("host")
+    fail(breaker, FAILURE_THRESHOLD)
+    clock.now += COOL_DOWN - 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    clock.now += 1
+    breaker.before()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before()                # a trial is already in flight
+    breaker.success()
+    assert breaker.state == CLOSED
+    breaker.before()
+
+
+def test_failed_trial_doubles_cool_down_up_to_max(clock):
+    breaker = CircuitBreaker("host")
+    fail(breaker, FAILURE_THRESHOLD)
+    cool_downs = []
+    for _ in range(6):
+        clock.now += breaker.cool_down
+        fail(breaker, 1)
+        assert breaker.state == OPEN
+        cool_downs.append(breaker.cool_down)
+    assert cool_downs == [120, 240, 480, MAX_COOL_DOWN, MAX_COOL_DOWN, MAX_COOL_DOWN]
+    clock.now += MAX_COOL_DOWN
+    breaker.before()
+    breaker.success()
+    assert breaker.cool_down == COOL_DOWN
+
+
+def test_get_retries_connection_errors(clock, make_poller):
+    po = make_poller(requests.exceptions.ConnectionError(), requests.exceptions.Timeout(), 200)
+    assert po.get(URL).status_code == 200
+    assert len(po.session.calls) == 3
+    assert len(clock.sleeps) == 2
+    assert clock.sleeps[0] <= BACKOFF_BASE and clock.sleeps[1] <= 2 * BACKOFF_BASE
+    assert po.metrics.stats()['counters'] == {'fetch.retries': 2}
+    assert po.breaker("api.example.com").failures == 0
+
+
+def test_get_gives_up_after_retries(clock, make_poller):
+    po = make_poller(*[requests.exceptions.Timeout()] * 3)
+    with pytest.raises(requests.exceptions.Timeout):
+        po.get(URL)
+    assert len(po.session.calls) == 3
+    assert po.breaker("api.example.com").failures == 1
+    assert po.metrics.timer_stats('fetch')['errors'] == 1
+
+
+def test_get_returns_final_server_error(clock, make_poller):
+    po = make_poller(503, 502, 500)
+    assert po.get(URL).status_code == 500
+    assert len(po.session.calls) == 3
+    assert po.breaker("api.example.com").failures == 1
+
+
+def test_get_does_not_retry_client_errors(clock, make_poller):
+    po = make_poller(404)
+    assert po.get(URL).status_code == 404
+    assert len(po.session.calls) == 1
+    assert clock.sleeps == []
+    assert po.breaker("api.example.com").state == CLOSED
+
+
+def test_get_retries_override(clock, make_poller):
+    po = make_poller(requests.exceptions.ConnectionError())
+    with pytest.raises(requests.exceptions.ConnectionError):
+        po.get(URL, timeout=(1.0, 1.0), retries=0)
+    assert po.session.calls == [(URL, (1.0, 1.0))]
+    assert clock.sleeps == []
+
+
+def test_get_fails_fast_once_breaker_opens(clock, make_poller):
+    po = make_poller(*[requests.exceptions.ConnectionError()] * FAILURE_THRESHOLD, retries=0)
+    for _ in range(FAILURE_THRESHOLD):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            po.get(URL)
+    with pytest.raises(CircuitOpenError):
+        po.get(URL)
+    assert len(po.session.calls) == FAILURE_THRESHOLD
+    assert po.metrics.stats()['counters'] == {'fetch.circuitOpen': 1}
+    # other hosts have their own breaker
+    po.session.outcomes.append(200)
+    assert po.get("http://192.168.1.20/json").status_code == 200
+
+
+def test_non_retryable_error_ends_trial(clock, make_poller):
+    po = make_poller(*[requests.exceptions.ConnectionError()] * FAILURE_THRESHOLD, retries=0)
+    for _ in range(FAILURE_THRESHOLD):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            po.get(URL)
+    breaker = po.breaker("api.example.com")
+    clock.now += COOL_DOWN
+    po.session.outcomes.append(requests.exceptions.InvalidURL())
+    with pytest.raises(requests.exceptions.InvalidURL):
+        po.get(URL)
+    assert breaker.state == OPEN and not breaker.trial
+    assert breaker.cool_down == 2 * COOL_DOWN
+    assert po.metrics.timer_stats('fetch')['errors'] == FAILURE_THRESHOLD + 1
+    # the next trial goes through once the doubled cool-down has passed
+    clock.now += 2 * COOL_DOWN
+    po.session.outcomes.append(200)
+    assert po.get(URL).status_code == 200
+    assert breaker.state == CLOSED
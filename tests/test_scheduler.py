@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Adaptive per-key poll scheduling."""
+
+import random
+
+from scheduler import PollScheduler, BACKOFF, COALESCE
+
+NOW = 1000000.0
+
+
+def scheduler_with(*keys, base=600, low=300, high=3600):
+    scheduler = PollScheduler(base, low, high)
+    for key in keys:
+        scheduler.add(key, due=NOW)
+    assert sorted(scheduler.pop_due(now=NOW)) == sorted(keys)
+    return scheduler
+
+
+def test_steady_sensor_polls_at_base_interval():
+    scheduler = scheduler_with('a')
+    scheduler.observe('a', last_seen=NOW - 30, pm25=10.0, now=NOW)
+    assert scheduler.due['a'] == NOW + 600
+
+
+def test_stale_sensor_backs_off_to_max():
+    scheduler = scheduler_with('a')
+    now = NOW
+    for _ in range(6):
+        scheduler.observe('a', last_seen=NOW - 7200, pm25=10.0, now=now)
+        interval = scheduler.due['a'] - now
+        now = scheduler.due['a']
+        scheduler.pop_due(now=now)
+    assert interval == 3600
+    assert scheduler.intervals['a'] == 3600
+
+
+def test_missing_sensor_backs_off():
+    scheduler = scheduler_with('a')
+    scheduler.missing('a', now=NOW)
+    assert scheduler.due['a'] == NOW + 600 * BACKOFF
+
+
+def test_fast_moving_sensor_speeds_up_then_relaxes():
+    scheduler = scheduler_with('a')
+    scheduler.observe('a', last_seen=NOW, pm25=10.0, now=NOW)
+    scheduler.pop_due(now=NOW + 600)
+    scheduler.observe('a', last_seen=NOW, pm25=30.0, now=NOW)
+    assert scheduler.intervals['a'] == 300
+
+    intervals = []
+    for pm25 in (31.0, 31.5, 32.0):
+        scheduler.pop_due(now=NOW + 3600)
+        scheduler.observe('a', last_seen=NOW, pm25=pm25, now=NOW)
+        intervals.append(scheduler.intervals['a'])
+    assert intervals == [450, 600, 600]
+
+
+def test_fixed_interval_does_not_adapt():
+    scheduler = PollScheduler(600, 300, 3600)
+    scheduler.add('local', due=NOW, interval=30)
+    scheduler.pop_due(now=NOW)
+    scheduler.observe('local', last_seen=NOW - 7200, pm25=100.0, now=NOW)
+    assert scheduler.due['local'] == NOW + 30
+    scheduler.set_stretch(10.0, now=NOW)
+    assert scheduler.due['local'] == NOW + 30
+
+
+def test_retry_and_in_flight():
+    scheduler = scheduler_with('a')
+    assert scheduler.in_flight('a')
+    scheduler.retry('a', now=NOW, delay=5)
+    assert not scheduler.in_flight('a')
+    assert scheduler.pop_due(now=NOW + 4) == []
+    assert scheduler.pop_due(now=NOW + 5) == ['a']
+
+
+def test_set_stretch_scales_pending_waits():
+    scheduler = scheduler_with('a')
+    scheduler.observe('a', now=NOW)
+    scheduler.set_stretch(4.0, now=NOW)
+    assert scheduler.due['a'] == NOW + 2400
+    scheduler.set_stretch(1.0, now=NOW + 600)
+    assert scheduler.due['a'] == NOW + 600 + 450
+
+
+def test_coalesces_keys_due_soon():
+    scheduler = PollScheduler(600, 300, 3600)
+    slack = COALESCE * 300
+    scheduler.add('a', due=NOW)
+    scheduler.add('b', due=NOW + slack - 1)
+    scheduler.add('c', due=NOW + slack + 1)
+    scheduler.add('local', due=NOW + 1, interval=30)
+    assert sorted(scheduler.pop_due(now=NOW)) == ['a', 'b']
+    assert scheduler.pop_due(now=NOW + 1) == ['local']
+    assert scheduler.pop_due(now=NOW + slack + 1) == ['c']
+
+
+def test_nothing_due_takes_nothing():
+    scheduler = PollScheduler(600, 300, 3600)
+    scheduler.add('a', due=NOW + 10)
+    assert scheduler.pop_due(now=NOW) == []
+    assert scheduler.delay(now=NOW) == 10
+
+
+def test_fixed_keys_do_not_start_a_batch():
+    scheduler = PollScheduler(600, 300, 3600)
+    scheduler.add('local', due=NOW, interval=30)
+    scheduler.add('a', due=NOW + 10)
+    assert scheduler.pop_due(now=NOW) == ['local']
+
+
+def test_jittery_sensors_stay_batched():
+    # 80 sensors with noisy pm2.5, the number of poll cycles a day stays near one per min_interval
+    rnd = random.Random(1)
+    scheduler = PollScheduler(600, 300, 3600)
+    keys = [str(i) for i in range(80)]
+    pm25 = {key: rnd.uniform(5, 40) for key in keys}
+    for key in keys:
+        scheduler.add(key, due=NOW)
+    cycles = 0
+    now = NOW
+    while now < NOW + 86400:
+        due = scheduler.pop_due(now=now)
+        if due:
+            cycles += 1
+            for key in due:
+                pm25[key] = max(0.0, pm25[key] + rnd.gauss(0, 4))
+                scheduler.observe(key, last_seen=now - 60, pm25=pm25[key], now=now)
+        now = max(scheduler.next_due(), now + 1)
+    assert cycles <= 86400 / 300 + 1
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Debounced AQI category and pm threshold events."""
+
+import pytest
+
+import indigo
+from triggers import (CategoryWatch, ThresholdWatch, make_watch, aqi_category,
+                      EVENT_AQI_CATEGORY, EVENT_PM_THRESHOLD)
+
+NOW = 1000000.0
+DWELL = 300.0
+
+
+def feed(watch, values, step=60.0):
+    """Feed values one step apart starting at NOW, return the messages of the checks that fired."""
+    fired = []
+    for (i, value) in enumerate(values):
+        message = watch.check(value, NOW + i * step)
+        if message is not None:
+            fired.append(message)
+    return fired
+
+
+def test_aqi_category_bands():
+    assert [aqi_category(v) for v in (0, 50, 51, 100, 101, 150, 151, 200, 201, 300, 301, 450, 600)] == \
+        [0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 5]
+
+
+def test_category_fires_only_after_dwell():
+    watch = CategoryWatch('sensorValue', 5.0, DWELL)
+    assert watch.check(40, NOW) is None                 # baseline, never fires
+    assert watch.check(60, NOW + 60) is None
+    assert watch.check(60, NOW + 60 + DWELL - 1) is None
+    assert watch.check(60, NOW + 60 + DWELL) == "AQI 60 changed from Good to Moderate"
+    assert watch.check(60, NOW + 60 + 2 * DWELL) is None
+
+
+def test_category_dwell_restarts_when_value_returns():
+    watch = CategoryWatch('sensorValue', 5.0, DWELL)
+    watch.check(40, NOW)
+    watch.check(60, NOW + 60)
+    watch.check(40, NOW + 120)                          # back to Good, the candidate is dropped
+    assert watch.check(60, NOW + 180) is None
+    assert watch.check(60, NOW + 180 + DWELL - 1) is None
+    assert watch.check(60, NOW + 180 + DWELL) is not None
+
+
+def test_category_jitter_inside_hysteresis_never_fires():
+    watch = CategoryWatch('sensorValue', 5.0, 0.0)
+    assert feed(watch, [50, 52, 48, 54, 46, 51, 49, 55, 45] * 20) == []
+    watch = CategoryWatch('sensorValue', 5.0, 0.0)
+    assert feed(watch, [51, 47, 54, 46, 52, 50] * 20) == []
+    assert watch.state == 1
+
+
+def test_category_fires_once_past_hysteresis():
+    watch = CategoryWatch('sensorValue', 5.0, 0.0)
+    assert feed(watch, [48, 56, 52, 48, 53, 56]) == ["AQI 56 changed from Good to Moderate"]
+    assert feed(watch, [46, 44]) == ["AQI 44 changed from Moderate to Good"]
+
+
+def test_category_jump_of_several_bands_fires_once():
+    watch = CategoryWatch('sensorValue', 5.0, DWELL)
+    assert feed(watch, [40, 180, 180, 180, 180, 180, 180, 180]) == ["AQI 180 changed from Good to Unhealthy"]
+    assert feed(watch, [20] * 7) == ["AQI 20 changed from Unhealthy to Good"]
+
+
+def test_category_dwell_keeps_running_while_climbing():
+    watch = CategoryWatch('sensorValue', 5.0, DWELL)
+    watch.check(40, NOW)
+    assert watch.check(60, NOW + 60) is None
+    assert watch.check(120, NOW + 200) is None
+    assert watch.check(120, NOW + 60 + DWELL) == "AQI 120 changed from Good to Unhealthy for Sensitive Groups"
+
+
+def test_category_direction_filter():
+    watch = CategoryWatch('sensorValue', 5.0, 0.0, direction="worse")
+    assert feed(watch, [60, 20, 60]) == ["AQI 60 changed from Good to Moderate"]
+    watch = CategoryWatch('sensorValue', 5.0, 0.0, direction="better")
+    assert feed(watch, [60, 20, 60]) == ["AQI 20 changed from Moderate to Good"]
+
+
+def test_category_filter():
+    watch = CategoryWatch('sensorValue', 5.0, 0.0, category="2")
+    assert feed(watch, [40, 60, 120, 60, 160, 120]) == \
+        ["AQI 120 changed from Moderate to Unhealthy for Sensitive Groups",
+         "AQI 120 changed from Unhealthy to Unhealthy for Sensitive Groups"]
+
+
+def test_rising_threshold_rearms_below_hysteresis():
+    watch = ThresholdWatch('pm2_5', 2.0, 0.0, 35.0)
+    assert feed(watch, [30, 36, 34, 36, 33.5, 36]) == ["pm2_5 36 rose above 35"]
+    assert feed(watch, [32, 36]) == ["pm2_5 36 rose above 35"]
+
+
+def test_rising_threshold_fires_only_after_dwell():
+    watch = ThresholdWatch('pm2_5', 2.0, DWELL, 35.0)
+    assert feed(watch, [30, 40, 40, 40, 40, 40]) == []
+    assert watch.check(40, NOW + 60 + DWELL) == "pm2_5 40 rose above 35"
+
+
+def test_falling_threshold_rearms_above_hysteresis():
+    watch = ThresholdWatch('pm2_5', 2.0, 0.0, 35.0, direction="falling")
+    assert feed(watch, [40, 34, 36, 34, 36.5, 34]) == ["pm2_5 34 fell below 35"]
+    assert feed(watch, [38, 34]) == ["pm2_5 34 fell below 35"]
+
+
+def test_make_watch_from_props():
+    watch = make_watch(EVENT_PM_THRESHOLD, {'pmState': 'pm10_0', 'threshold': '50', 'hysteresis': '3',
+                                            'dwellMinutes': '2', 'direction': 'falling'})
+    assert isinstance(watch, ThresholdWatch)
+    assert (watch.state_key, watch.threshold, watch.hysteresis, watch.dwell, watch.direction) == \
+        ('pm10_0', 50.0, 3.0, 120.0, 'falling')
+    watch = make_watch(EVENT_AQI_CATEGORY, {})
+    assert isinstance(watch, CategoryWatch)
+    assert (watch.state_key, watch.hysteresis, watch.dwell, watch.direction, watch.category) == \
+        ('sensorValue', 5.0, 300.0, 'any', 'any')
+    with pytest.raises(ValueError):
+        make_watch(EVENT_PM_THRESHOLD, {'threshold': 'abc'})
+    with pytest.raises(ValueError):
+        make_watch('noSuchEvent', {})
+
+
+def test_validate_event_config_accepts_good_values(plugin):
+    values = indigo.Dict(deviceId='12', hysteresis='5', dwellMinutes='0')
+    assert plugin.validateEventConfigUi(values, EVENT_AQI_CATEGORY, 1) == (True, values)
+    values = indigo.Dict(deviceId='12', hysteresis='2', dwellMinutes='5', threshold='35')
+    assert plugin.validateEventConfigUi(values, EVENT_PM_THRESHOLD, 1) == (True, values)
+
+
+@pytest.mark.parametrize('type_id,changes,field', [
+    (EVENT_AQI_CATEGORY, {'deviceId': ''}, 'deviceId'),
+    (EVENT_AQI_CATEGORY, {'hysteresis': 'abc'}, 'hysteresis'),
+    (EVENT_AQI_CATEGORY, {'hysteresis': '-1'}, 'hysteresis'),
+    (EVENT_AQI_CATEGORY, {'dwellMinutes': ''}, 'dwellMinutes'),
+    (EVENT_PM_THRESHOLD, {'dwellMinutes': '-5'}, 'dwellMinutes'),
+    (EVENT_PM_THRESHOLD, {'threshold': ''}, 'threshold'),
+    (EVENT_PM_THRESHOLD, {'threshold': 'high'}, 'threshold'),
+    (EVENT_PM_THRESHOLD, {'threshold': '-35'}, 'threshold'),
+])
+def test_validate_event_config_rejects_bad_values(plugin, type_id, changes, field):
+    values = indigo.Dict(deviceId='12', hysteresis='2', dwellMinutes='5', threshold='35')
+    values.update(changes)
+    result = plugin.validateEventConfigUi(values, type_id, 1)
+    assert result[0] is False
+    assert list(result[2]) == [field]